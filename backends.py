@@ -0,0 +1,185 @@
+"""IPC backends.
+
+All three backends expose the same small request interface used by
+SwayListener and main.py:
+
+* ``socket_path`` is the socket the backend reads from (sway's, or the
+  hub's),
+* ``get_tree_data()`` returns the GET_TREE reply as plain JSON data,
+* ``command(cmd)`` runs a sway command.
+
+The ``i3ipc`` backend goes through i3ipc-python, which builds a full graph of
+``Con`` objects for every reply. The ``raw`` backend talks to the sway socket
+directly and hands the decoded JSON straight to ``tree.Node``. The ``hub``
+backend gets its trees from a running hub (see hub.py) instead of sway.
+
+Sway events are read with ``EventSocket``, a non-blocking subscription
+reader meant to be driven from a main loop IO watch; the hub backend's
+``subscribe()`` returns a reader with the same contract.
+"""
+import json
+import os
+import socket
+import struct
+import subprocess
+
+BACKENDS = ("i3ipc", "raw", "hub")
+
+# i3 IPC message types
+RUN_COMMAND = 0
+SUBSCRIBE = 2
+GET_TREE = 4
+
+# Event numbers (the reply type has the high bit set)
+EVENT_NAMES = {
+    0: "workspace",
+    1: "output",
+    2: "mode",
+    3: "window",
+    4: "barconfig_update",
+    5: "binding",
+    6: "shutdown",
+    7: "tick",
+}
+
+MAGIC = b"i3-ipc"
+HEADER = struct.Struct("=6sII")
+
+
+def _send(sock, message_type, payload=b""):
+    sock.sendall(HEADER.pack(MAGIC, len(payload), message_type) + payload)
+
+
+def _recv_exactly(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("sway IPC socket closed")
+        buf += chunk
+    return bytes(buf)
+
+
+def _recv(sock):
+    magic, length, message_type = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+    if magic != MAGIC:
+        raise ConnectionError("Invalid IPC reply")
+    return message_type, _recv_exactly(sock, length)
+
+
+def connect(backend="i3ipc"):
+    if backend == "raw":
+        return RawConnection()
+    if backend == "hub":
+        import hub
+        return hub.HubConnection()
+    return I3ipcConnection()
+
+
+def find_socket_path():
+    path = os.environ.get("SWAYSOCK") or os.environ.get("I3SOCK")
+    if path:
+        return path
+    try:
+        return subprocess.check_output(["sway", "--get-socketpath"],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        raise OSError("Could not find the sway IPC socket (is SWAYSOCK set?)")
+
+
+class RawConnection:
+    """Minimal sway IPC client that skips i3ipc's object model.
+
+    Requests are made from the main loop only, one at a time, so the
+    command socket needs no locking.
+    """
+
+    def __init__(self, socket_path=None):
+        self.socket_path = socket_path or find_socket_path()
+        self._cmd_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._cmd_socket.connect(self.socket_path)
+
+    def message(self, message_type, payload=b""):
+        """Send a request and return the raw reply body."""
+        _send(self._cmd_socket, message_type, payload)
+        _, body = _recv(self._cmd_socket)
+        return body
+
+    # ----- Requests -----
+
+    def command(self, cmd):
+        return json.loads(self.message(RUN_COMMAND, cmd.encode()))
+
+    def get_tree_data(self):
+        return json.loads(self.message(GET_TREE))
+
+
+class I3ipcConnection:
+    """Adapter giving i3ipc.Connection the backend interface."""
+
+    def __init__(self):
+        import i3ipc  # Only needed (and paid for) when this backend is used
+        self.conn = i3ipc.Connection()
+        self.socket_path = self.conn.socket_path
+
+    def command(self, cmd):
+        return self.conn.command(cmd)
+
+    def get_tree_data(self):
+        return self.conn.get_tree().ipc_data
+
+
+class EventSocket:
+    """Non-blocking reader for an IPC subscription socket.
+
+    ``open()`` subscribes and returns a file descriptor to watch; call
+    ``read()`` whenever it is readable. Complete messages are decoded and
+    passed to ``handler(event_name, payload)``; partial ones stay buffered.
+    """
+
+    def __init__(self, socket_path, events, handler):
+        self.socket_path = socket_path
+        self.events = list(events)
+        self.handler = handler
+        self.sock = None
+        self._buf = bytearray()
+
+    def open(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+        _send(self.sock, SUBSCRIBE, json.dumps(self.events).encode())
+        _recv(self.sock)  # {"success": true}
+        self.sock.setblocking(False)
+        return self.sock.fileno()
+
+    def read(self):
+        """Drain the socket. Returns False once sway closed the connection."""
+        closed = False
+        while True:
+            try:
+                chunk = self.sock.recv(65536)
+            except BlockingIOError:
+                break
+            if not chunk:
+                closed = True
+                break
+            self._buf += chunk
+
+        while len(self._buf) >= HEADER.size:
+            magic, length, message_type = HEADER.unpack_from(self._buf)
+            if magic != MAGIC:
+                raise ConnectionError("Invalid IPC event")
+            end = HEADER.size + length
+            if len(self._buf) < end:
+                break
+            body = bytes(self._buf[HEADER.size:end])
+            del self._buf[:end]
+            name = EVENT_NAMES.get(message_type & 0x7f)
+            if name in self.events:
+                self.handler(name, json.loads(body))
+        return not closed
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
@@ -0,0 +1,80 @@
+"""Compare GET_TREE parse cost: i3ipc Con objects vs. the raw backend's Nodes.
+
+    python3 bench/bench_parse.py [--outputs 3 --workspaces 10 --depth 4 --fanout 3]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench.synthetic import TreeGenerator, leaves  # noqa: E402
+from tree import Node  # noqa: E402
+
+
+def parse_i3ipc(raw):
+    from i3ipc.con import Con
+    return Con(json.loads(raw), None, None)
+
+
+def parse_raw(raw):
+    return Node.from_dict(json.loads(raw))
+
+
+def measure(parse, raw, repeat):
+    # Time
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(raw)
+        times.append(time.perf_counter() - start)
+
+    # Memory retained by the parsed tree (transient JSON dicts excluded)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tree = parse(raw)
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    retained = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    del tree
+    times.sort()
+    return times[len(times) // 2], retained, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--outputs", type=int, default=3)
+    parser.add_argument("--workspaces", type=int, default=10)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--floating", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    data = TreeGenerator().tree(args.outputs, args.workspaces, args.depth, args.fanout,
+                                args.floating, kinds=("split", "tabbed", "stacked"))
+    raw = json.dumps(data).encode()
+    print(f"tree: {sum(1 for _ in leaves(data))} windows, {len(raw) / 1024:.0f} KiB of JSON")
+    print(f"{'parser':<8} {'median':>10} {'retained':>12} {'peak':>12}")
+
+    parsers = [("raw", parse_raw)]
+    try:
+        import i3ipc  # noqa: F401
+        parsers.insert(0, ("i3ipc", parse_i3ipc))
+    except ImportError:
+        print("(i3ipc not installed, skipping it)")
+
+    for name, parse in parsers:
+        median, retained, peak = measure(parse, raw, args.repeat)
+        print(f"{name:<8} {median * 1000:8.2f}ms {retained / 1024:9.0f}KiB {peak / 1024:9.0f}KiB")
+
+
+if __name__ == "__main__":
+    main()
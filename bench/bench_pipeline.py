@@ -0,0 +1,209 @@
+"""Headless end-to-end benchmark: events -> model -> layout -> paint.
+
+Generates a synthetic sway tree and event stream (or replays a recorded one),
+feeds the events through SwayListener against a fake connection, and renders
+every published workspace into an offscreen cairo ImageSurface. No display and
+no running sway are needed.
+
+    python3 bench/bench_pipeline.py --preset large
+    python3 bench/bench_pipeline.py --save baseline.json
+    python3 bench/bench_pipeline.py --compare baseline.json --threshold 1.25
+"""
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import recording  # noqa: E402
+from bench.synthetic import TreeGenerator, event_stream  # noqa: E402
+from replay import ReplayConnection  # noqa: E402
+from timing import Timings  # noqa: E402
+from layout import LayoutEngine  # noqa: E402
+from tree import TreeModel  # noqa: E402
+
+PRESETS = {
+    # outputs, workspaces per output, depth, fanout, floating per workspace
+    "small": dict(outputs=1, workspaces=4, depth=2, fanout=2, floating=0),
+    "deep": dict(outputs=1, workspaces=2, depth=8, fanout=2, floating=0),
+    "wide": dict(outputs=1, workspaces=4, depth=1, fanout=60, floating=0),
+    "large": dict(outputs=3, workspaces=10, depth=4, fanout=3, floating=2),
+}
+
+
+def make_listener(conn, on_publish):
+    """A SwayListener driven by hand, or None if GLib is missing."""
+    try:
+        from ipc import SwayListener
+    except (ImportError, ValueError):
+        return None
+    return SwayListener(callback=on_publish, connection=conn, check_interval=0)
+
+
+def run(tree_data, events, width, height, renderers):
+    timings = Timings(("event", "publish", "layout", "paint", "paint_retained"))
+    engine = LayoutEngine(include_floating=True)
+    published = []
+
+    conn = ReplayConnection(tree_data)
+    listener = make_listener(conn, lambda ws, path, diff: published.append(ws))
+    if listener is not None:
+        listener.refresh_tree(conn)
+
+        def apply(name, data):
+            listener.on_ipc_event(name, data)
+
+        def flush():
+            # Equivalent to the scheduler's timeout firing after a burst
+            listener.flush()
+    else:
+        print("(GLib not available: replaying through TreeModel directly)")
+        model = TreeModel()
+        model.reset(tree_data)
+        needs_resync = []
+
+        def apply(name, data):
+            if name == "window":
+                ok = model.apply_window_event(data["change"], data["container"])
+            elif name == "workspace":
+                ok = model.apply_workspace_event(data["change"], data.get("current"))
+            else:
+                ok = False
+            if not ok:
+                needs_resync.append(True)
+
+        def flush():
+            if needs_resync:
+                needs_resync.clear()
+                model.reset(conn.get_tree_data())
+            published.append(model.focused_view()[0])
+
+    surface, immediate, retained = renderers or (None, None, None)
+    version = 0
+    for i, (name, data) in enumerate(events):
+        timings.time("event", apply, name, data)
+        # Publish in bursts of 4 events, like the debounce window would
+        if i % 4 == 3:
+            timings.time("publish", flush)
+        while published:
+            ws = published.pop()
+            version += 1
+            layout = timings.time("layout", engine.layout, version, ws, 10, 30, width, height)
+            if surface is not None:
+                timings.time("paint", immediate, layout)
+                timings.time("paint_retained", retained, layout)
+
+    return timings
+
+
+def make_renderers(width, height):
+    try:
+        import cairo
+        from render import paint_layout, RetainedRenderer
+    except ImportError:
+        print("(pycairo not available: skipping paint stages)")
+        return None
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width + 20, height + 40)
+    ctx = cairo.Context(surface)
+    renderer = RetainedRenderer()
+
+    def immediate(layout):
+        ctx.set_source_rgb(0.15, 0.15, 0.15)
+        ctx.paint()
+        paint_layout(ctx, layout, 1.0)
+        surface.flush()
+
+    def retained(layout):
+        ctx.set_source_rgb(0.15, 0.15, 0.15)
+        ctx.paint()
+        renderer.paint(ctx, layout, 1.0)
+        surface.flush()
+
+    return surface, immediate, retained
+
+
+def load_events(path):
+    """Events and the first tree snapshot (or None) from a replay file.
+
+    Accepts a --record recording, or a JSON-lines file of
+    {"event": name, "payload": data}.
+    """
+    if recording.is_recording(path):
+        records = recording.load(path)
+        tree = next((r.data for r in records if r.kind == "tree"), None)
+        return [(r.name, r.data) for r in records if r.kind == "event"], tree
+    with open(path) as f:
+        return [(rec["event"], rec["payload"]) for rec in map(json.loads, f)], None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="large")
+    parser.add_argument("--events", type=int, default=2000, help="Number of synthetic events")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="Replay events from a --record recording or a JSON-lines file")
+    parser.add_argument("--tree", metavar="FILE", help="Use a saved GET_TREE reply instead")
+    parser.add_argument("--size", default="1600x900", help="Render size WxH")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-alloc", action="store_true", help="Skip the allocation pass")
+    parser.add_argument("--save", metavar="FILE", help="Write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="FILE", help="Compare p50s against a baseline")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Fail if a stage's p50 is this many times slower than the baseline")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split("x"))
+    events = recorded_tree = None
+    if args.replay:
+        events, recorded_tree = load_events(args.replay)
+    if args.tree:
+        with open(args.tree) as f:
+            tree_data = json.load(f)
+    elif recorded_tree is not None:
+        tree_data = recorded_tree
+    else:
+        tree_data = TreeGenerator(args.seed).tree(kinds=("split", "tabbed", "stacked"),
+                                                  **PRESETS[args.preset])
+    if events is None:
+        events = list(event_stream(tree_data, args.events, args.seed))
+
+    renderers = make_renderers(width, height)
+    timings = run(tree_data, events, width, height, renderers)
+    results = {"stages": timings.summary()}
+
+    # Allocations are measured in a separate pass so tracing does not skew timings
+    if not args.no_alloc:
+        tracemalloc.start()
+        run(tree_data, events, width, height, renderers)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results["alloc"] = {"retained_bytes": current, "peak_bytes": peak}
+
+    timings.report(sys.stdout, width=15)
+    if "alloc" in results:
+        print(f"allocations: peak {results['alloc']['peak_bytes'] / 1024:.0f} KiB, "
+              f"retained {results['alloc']['retained_bytes'] / 1024:.0f} KiB")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["stages"]
+        failed = False
+        for name, s in results["stages"].items():
+            base = baseline.get(name)
+            if not base or not base["p50"]:
+                continue
+            ratio = s["p50"] / base["p50"]
+            status = "REGRESSION" if ratio > args.threshold else "ok"
+            failed |= ratio > args.threshold
+            print(f"{name:<15} {ratio:5.2f}x baseline  {status}")
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""Soak test: run the viewer pipeline for hours and check that RSS stays flat.
+
+Simulates a busy session against a fake connection: windows are retitled,
+focused, opened and closed (so con ids keep changing), bindings force full
+resyncs, and every publish is laid out, diffed into the search index and,
+if pycairo is available, painted through the retained renderer. RSS is
+sampled after a warmup; the run fails if it grows by more than
+``--max-growth`` MB, or if it ends before two samples were taken.
+
+    python3 bench/soak.py --duration 14400          # four hours
+    python3 bench/soak.py --duration 120 --preset small
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench.bench_pipeline import PRESETS, make_listener  # noqa: E402
+from bench.synthetic import TreeGenerator, leaves  # noqa: E402
+from diff import diff_trees  # noqa: E402
+from layout import LayoutEngine  # noqa: E402
+from replay import ReplayConnection  # noqa: E402
+from search import SearchIndex  # noqa: E402
+from tree import TreeModel  # noqa: E402
+
+
+def rss_bytes():
+    """Current resident set size (Linux), or peak RSS elsewhere."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Session:
+    """A mutable GET_TREE reply plus the events that change it."""
+
+    def __init__(self, data, seed=0):
+        self.data = data
+        self.rng = random.Random(seed)
+        self.next_id = 10 ** 6
+        self.parents = {}  # con id -> parent dict
+        self._index(data, None)
+
+    def _index(self, node, parent):
+        if parent is not None:
+            self.parents[node["id"]] = parent
+        for child in node["nodes"] + node["floating_nodes"]:
+            self._index(child, node)
+
+    def tree(self):
+        # Sway serializes a fresh reply for every request
+        return json.loads(json.dumps(self.data))
+
+    def _windows(self):
+        return list(leaves(self.data))
+
+    def events(self):
+        """Endless stream of (event name, payload)."""
+        kinds = ["title", "focus", "binding", "open", "close"]
+        weights = [60, 25, 5, 5, 5]
+        focused = next((w for w in self._windows() if w.get("focused")), None)
+        target = len(self._windows())
+        while True:
+            kind = self.rng.choices(kinds, weights)[0]
+            windows = self._windows()
+            # Keep the window count near its starting point, so memory use
+            # reflects churn rather than a growing session
+            if kind == "open" and len(windows) > target * 1.2:
+                kind = "close"
+            elif kind == "close" and len(windows) < target * 0.8:
+                kind = "open"
+            win = self.rng.choice(windows)
+            if kind == "title":
+                win["name"] = f"{win.get('app_id')} — {self.rng.randrange(10 ** 6)}"
+                yield "window", {"change": "title", "container": dict(win)}
+            elif kind == "focus":
+                if focused is not None:
+                    focused["focused"] = False
+                win["focused"] = True
+                focused = win
+                yield "window", {"change": "focus", "container": dict(win)}
+            elif kind == "open":
+                parent = self.parents[win["id"]]
+                self.next_id += 1
+                new = dict(win, id=self.next_id, focused=False, marks=[],
+                           name=f"{win.get('app_id')} — new", nodes=[], floating_nodes=[])
+                parent["nodes"].append(new)
+                self.parents[new["id"]] = parent
+                yield "window", {"change": "new", "container": dict(new)}
+            elif kind == "close":
+                parent = self.parents[win["id"]]
+                if len(parent["nodes"]) < 2 or win is focused:
+                    continue
+                parent["nodes"].remove(win)
+                del self.parents[win["id"]]
+                yield "window", {"change": "close", "container": dict(win)}
+            else:
+                yield "binding", {"change": "run", "binding": {"command": "layout toggle split"}}
+
+
+def make_painter(width, height):
+    try:
+        import cairo
+        from render import RetainedRenderer, SurfaceCache
+    except ImportError:
+        print("(pycairo not available: not painting)")
+        return None
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width + 20, height + 40)
+    ctx = cairo.Context(surface)
+    renderer = RetainedRenderer(SurfaceCache(budget=16 * 1024 * 1024))
+
+    def paint(layout):
+        ctx.set_source_rgb(0.15, 0.15, 0.15)
+        ctx.paint()
+        renderer.paint(ctx, layout, 1.0)
+        surface.flush()
+    return paint
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="large")
+    parser.add_argument("--duration", type=float, default=3600, help="Seconds to run")
+    parser.add_argument("--warmup", type=float, default=None,
+                        help="Seconds before the RSS baseline is taken (default: 10%% of the run)")
+    parser.add_argument("--sample", type=float, default=None,
+                        help="Seconds between RSS samples (default: 1/30 of the run)")
+    parser.add_argument("--max-growth", type=float, default=4.0,
+                        help="Fail if RSS grows by more than this many MB after the warmup")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    warmup = args.warmup if args.warmup is not None else max(5.0, args.duration * 0.1)
+    interval = args.sample if args.sample is not None else max(1.0, args.duration / 30)
+
+    data = TreeGenerator(args.seed).tree(kinds=("split", "tabbed", "stacked"),
+                                         **PRESETS[args.preset])
+    session = Session(data, args.seed)
+    conn = ReplayConnection(None)
+    conn.get_tree_data = session.tree
+
+    engine = LayoutEngine(include_floating=True)
+    index = SearchIndex()
+    paint = make_painter(1600, 900)
+    published = []
+
+    listener = make_listener(conn, lambda ws, path, diff: published.append(ws))
+    if listener is not None:
+        listener.add_diff_listener(index.apply_diff)
+        listener.refresh_tree(conn)
+
+        def apply(name, payload):
+            listener.on_ipc_event(name, payload)
+
+        def flush():
+            listener.flush()
+    else:
+        print("(GLib not available: driving TreeModel directly)")
+        model = TreeModel()
+        model.reset(conn.get_tree_data())
+        index.rebuild(model.root)
+        state = {"resync": False, "root": model.root}
+
+        def apply(name, payload):
+            if name == "window":
+                ok = model.apply_window_event(payload["change"], payload["container"])
+            else:
+                ok = False
+            state["resync"] |= not ok
+
+        def flush():
+            if state["resync"]:
+                state["resync"] = False
+                model.reset(conn.get_tree_data())
+            diff = diff_trees(state["root"], model.root)
+            state["root"] = model.root
+            if diff:
+                index.apply_diff(diff)
+                published.append(model.focused_view()[0])
+
+    start = time.monotonic()
+    next_sample = start + warmup
+    samples = []  # (elapsed seconds, rss)
+    events = 0
+    version = 0
+    for i, (name, payload) in enumerate(session.events()):
+        apply(name, payload)
+        events += 1
+        if i % 4 == 3:
+            flush()
+        while published:
+            ws = published.pop()
+            published.clear()  # Only the newest snapshot is ever kept
+            version += 1
+            layout = engine.layout(version, ws, 10, 30, 1600, 900)
+            if paint is not None:
+                paint(layout)
+
+        now = time.monotonic()
+        if now >= next_sample:
+            gc.collect()
+            samples.append((now - start, rss_bytes()))
+            print(f"{now - start:8.0f}s  {events:>9} events  "
+                  f"rss {samples[-1][1] / 2 ** 20:7.1f} MB  index {len(index)}", flush=True)
+            next_sample = now + interval
+        if now - start >= args.duration:
+            break
+
+    if len(samples) < 2:
+        # A soak that measured nothing must not pass in CI
+        print(f"Run too short to judge: {len(samples)} RSS sample(s) after the "
+              f"{warmup:.0f}s warmup (increase --duration)", file=sys.stderr)
+        sys.exit(2)
+    baseline = samples[0][1]
+    growth = max(rss for _, rss in samples) - baseline
+    print(f"RSS growth after warmup: {growth / 2 ** 20:.2f} MB "
+          f"(limit {args.max_growth:.1f} MB) over {events} events")
+    sys.exit(1 if growth > args.max_growth * 2 ** 20 else 0)
+
+
+if __name__ == "__main__":
+    main()
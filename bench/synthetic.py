@@ -0,0 +1,133 @@
+"""Synthetic GET_TREE replies for benchmarks (no sway needed)."""
+import itertools
+import random
+
+# Fields sway sends for every container; most are ignored by the viewer but
+# still cost time to decode and, with i3ipc, to turn into Con attributes.
+_EXTRA_FIELDS = {
+    "orientation": "none", "percent": None, "urgent": False, "marks": [],
+    "border": "normal", "current_border_width": 2, "sticky": False,
+    "deco_rect": {"x": 0, "y": 0, "width": 0, "height": 0},
+    "window_rect": {"x": 0, "y": 0, "width": 0, "height": 0},
+    "geometry": {"x": 0, "y": 0, "width": 0, "height": 0},
+    "fullscreen_mode": 0, "floating": None, "scratchpad_state": "none",
+}
+
+
+class TreeGenerator:
+    """Builds sway-shaped JSON trees with unique, stable con ids."""
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self._ids = itertools.count(1)
+
+    def con(self, type="con", name=None, layout="none", rect=(0, 0, 1920, 1080),
+            nodes=(), floating_nodes=(), **extra):
+        x, y, w, h = rect
+        nodes = list(nodes)
+        floating_nodes = list(floating_nodes)
+        data = dict(_EXTRA_FIELDS)
+        data.update({
+            "id": next(self._ids), "type": type, "name": name, "layout": layout,
+            "rect": {"x": x, "y": y, "width": w, "height": h},
+            "focused": False,
+            "focus": [n["id"] for n in nodes + floating_nodes],
+            "nodes": nodes, "floating_nodes": floating_nodes,
+        })
+        data.update(extra)
+        return data
+
+    def window(self, rect):
+        app = self.rng.choice(["firefox", "foot", "code", "thunar", "mpv"])
+        return self.con(name=f"{app} — window {self.rng.randrange(10 ** 6)}", rect=rect,
+                        app_id=app, pid=self.rng.randrange(1000, 99999),
+                        visible=True, shell="xdg_shell")
+
+    def split(self, rect, depth, fanout):
+        """Nested alternating splith/splitv containers ``depth`` levels deep."""
+        if depth == 0:
+            return self.window(rect)
+        x, y, w, h = rect
+        layout = "splith" if depth % 2 else "splitv"
+        children = []
+        for i in range(fanout):
+            if layout == "splith":
+                child_rect = (x + i * w // fanout, y, w // fanout, h)
+            else:
+                child_rect = (x, y + i * h // fanout, w, h // fanout)
+            children.append(self.split(child_rect, depth - 1, fanout))
+        return self.con(layout=layout, rect=rect, nodes=children)
+
+    def tabbed(self, rect, count, layout="tabbed"):
+        """A wide tabbed/stacked container with ``count`` windows."""
+        return self.con(layout=layout, rect=rect,
+                        nodes=[self.window(rect) for _ in range(count)])
+
+    def workspace(self, name, rect, kind="split", depth=3, fanout=2, floating=0):
+        if kind == "tabbed" or kind == "stacked":
+            content = [self.tabbed(rect, fanout ** depth, kind)]
+        else:
+            content = [self.split(rect, depth, fanout)]
+        x, y, w, h = rect
+        floats = [self.con(type="floating_con", rect=(x + 100, y + 100, w // 3, h // 3),
+                           nodes=[self.window(rect)]) for _ in range(floating)]
+        return self.con(type="workspace", name=name, layout="splith", rect=rect,
+                        nodes=content, floating_nodes=floats)
+
+    def tree(self, outputs=1, workspaces=1, depth=3, fanout=2, floating=0, kinds=("split",)):
+        """A full tree; the first workspace of the first output is focused."""
+        output_nodes = []
+        ws_num = 1
+        for o in range(outputs):
+            rect = (o * 1920, 0, 1920, 1080)
+            ws_nodes = []
+            for _ in range(workspaces):
+                kind = kinds[(ws_num - 1) % len(kinds)]
+                ws_nodes.append(self.workspace(str(ws_num), rect, kind, depth, fanout, floating))
+                ws_num += 1
+            output_nodes.append(self.con(type="output", name=f"OUT-{o}", layout="output",
+                                         rect=rect, nodes=ws_nodes))
+        root = self.con(type="root", name="root", layout="splith", nodes=output_nodes,
+                        rect=(0, 0, 1920 * outputs, 1080))
+
+        # Focus the first leaf of the first workspace
+        node = root
+        while node["nodes"]:
+            node = node["nodes"][0]
+        node["focused"] = True
+        return root
+
+
+def leaves(data):
+    """All window containers in a JSON tree."""
+    if not data["nodes"] and data["type"] in ("con", "floating_con"):
+        yield data
+    for child in data["nodes"] + data["floating_nodes"]:
+        yield from leaves(child)
+
+
+
+def event_stream(data, count, seed=0, mix=None):
+    """Generate a plausible stream of ``(event_name, payload)`` IPC events.
+
+    ``mix`` maps event kinds to relative weights. Title and focus changes are
+    applied as deltas by the model; ``new`` and ``binding`` force a resync.
+    """
+    rng = random.Random(seed)
+    mix = mix or {"title": 60, "focus": 25, "binding": 8, "new": 4, "workspace": 3}
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    windows = list(leaves(data))
+    workspaces = [ws for out in data["nodes"] for ws in out["nodes"]]
+
+    for _ in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        if kind in ("title", "focus", "new"):
+            win = rng.choice(windows)
+            if kind == "title":
+                win = dict(win, name=f"{win.get('app_id')} — {rng.randrange(10 ** 6)}")
+            yield "window", {"change": kind, "container": win}
+        elif kind == "workspace":
+            yield "workspace", {"change": "focus", "current": rng.choice(workspaces), "old": None}
+        else:
+            yield "binding", {"change": "run", "binding": {"command": "layout toggle split"}}
@@ -0,0 +1,126 @@
+import os
+import socket
+
+# Commands understood by a resident instance
+COMMANDS = ("toggle", "show", "hide", "quit")
+
+
+def socket_path(suffix="ctl"):
+    """Per-session socket (one per sway instance and purpose).
+
+    ``ctl`` is the daemon control socket; the metrics endpoint and the hub
+    use their own suffixes next to it.
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or "/tmp"
+    session = os.path.basename(os.environ.get("SWAYSOCK") or
+                               os.environ.get("WAYLAND_DISPLAY") or "default")
+    return os.path.join(runtime_dir, f"swaytreeviewer-{session}.{suffix}")
+
+
+def is_running(path, timeout=0.5):
+    """True if something accepts connections on the Unix socket ``path``."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+        return True
+    except OSError:
+        return False
+
+
+def send_command(command, path=None, timeout=0.5):
+    """Ask a running daemon to do something.
+
+    Returns the daemon's reply, or None if no daemon is listening. Only uses
+    the standard library so toggling never pays for importing GTK.
+    """
+    path = path or socket_path()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall(command.encode() + b"\n")
+            return sock.recv(64).decode().strip()
+    except OSError:
+        return None
+
+
+class UnixServer:
+    """Listening Unix socket served from the GLib main loop.
+
+    Every accepted connection is passed to ``on_accept(sock)``. Refuses to
+    start while another process serves the same path; a socket file left
+    behind by a process that died is replaced.
+    """
+
+    def __init__(self, path, on_accept, backlog=4):
+        self.path = path
+        self.on_accept = on_accept
+        self.backlog = backlog
+        self.sock = None
+        self._watch_id = None
+
+    def start(self):
+        # Imported here so the client helpers above stay GTK-free
+        from gi.repository import GLib
+
+        if is_running(self.path):
+            raise OSError(f"{self.path} is already in use by another instance")
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self.sock.listen(self.backlog)
+        self._watch_id = GLib.io_add_watch(self.sock.fileno(), GLib.PRIORITY_DEFAULT,
+                                           GLib.IO_IN, self._on_ready)
+
+    def _on_ready(self, fd, condition):
+        try:
+            conn, _ = self.sock.accept()
+        except OSError:
+            return True
+        self.on_accept(conn)
+        return True  # Keep watching
+
+    def stop(self):
+        if self._watch_id is not None:
+            from gi.repository import GLib
+            GLib.source_remove(self._watch_id)
+            self._watch_id = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+class DaemonServer:
+    """Accepts control commands on a Unix socket inside the GLib main loop."""
+
+    def __init__(self, handler, path=None):
+        self.handler = handler  # handler(command) -> reply string
+        self.server = UnixServer(path or socket_path(), self._on_accept)
+
+    @property
+    def path(self):
+        return self.server.path
+
+    def start(self):
+        self.server.start()
+
+    def _on_accept(self, conn):
+        with conn:
+            conn.settimeout(0.5)
+            try:
+                command = conn.recv(64).decode().strip()
+                reply = self.handler(command) if command in COMMANDS else "unknown command"
+                conn.sendall((reply or "ok").encode() + b"\n")
+            except OSError:
+                pass
+
+    def stop(self):
+        self.server.stop()
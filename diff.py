@@ -0,0 +1,166 @@
+"""Structural diff of two tree snapshots, keyed by con id.
+
+Snapshots are copy-on-write (see ``tree.TreeModel``): any subtree that did
+not change is the very same object in both trees, so ``diff_trees`` prunes
+it with an identity check and only walks the paths that were copied. After
+a delta that is proportional to the number of changed nodes; after a full
+resync (where every node is new) it degrades to a single walk of the tree.
+"""
+
+# Change kinds
+ADDED = "added"
+REMOVED = "removed"
+MOVED = "moved"                  # New parent, or new place among its siblings
+RESIZED = "resized"              # Sway rect changed
+RETITLED = "retitled"            # Name (or app_id) changed
+MARKED = "marked"                # Marks changed
+FOCUS_CHANGED = "focus-changed"  # Focused flag or focus stack order changed
+LAYOUT_CHANGED = "layout-changed"  # Layout (splith/tabbed/...) or type changed
+
+KINDS = (ADDED, REMOVED, MOVED, RESIZED, RETITLED, MARKED, FOCUS_CHANGED, LAYOUT_CHANGED)
+
+# Kinds that can move or resize boxes on screen
+GEOMETRIC = frozenset((ADDED, REMOVED, MOVED, RESIZED, LAYOUT_CHANGED))
+
+
+class Change:
+    """One classified change to a single container."""
+
+    __slots__ = ("kind", "con_id", "old", "new")
+
+    def __init__(self, kind, con_id, old=None, new=None):
+        self.kind = kind
+        self.con_id = con_id
+        self.old = old  # Node before the change (None if added)
+        self.new = new  # Node after the change (None if removed)
+
+    def __repr__(self):
+        return f"<Change {self.kind} {self.con_id}>"
+
+
+class TreeDiff:
+    """The changes between two snapshots. Falsy when nothing changed."""
+
+    def __init__(self, changes):
+        self.changes = changes
+
+    def __bool__(self):
+        return bool(self.changes)
+
+    def __len__(self):
+        return len(self.changes)
+
+    def __iter__(self):
+        return iter(self.changes)
+
+    def of_kind(self, *kinds):
+        return [c for c in self.changes if c.kind in kinds]
+
+    def ids(self, *kinds):
+        """Con ids with a change of any of ``kinds`` (all kinds if none given)."""
+        return {c.con_id for c in self.changes if not kinds or c.kind in kinds}
+
+    @property
+    def geometric(self):
+        """True if boxes may have moved or resized (not just relabelled)."""
+        for c in self.changes:
+            if c.kind in GEOMETRIC:
+                return True
+            # A tabbed/stacked container shows its most recently focused child
+            if (c.kind == FOCUS_CHANGED and c.new.layout in ("tabbed", "stacked")
+                    and c.old.focus[:1] != c.new.focus[:1]):
+                return True
+        return False
+
+    def summary(self):
+        counts = {}
+        for c in self.changes:
+            counts[c.kind] = counts.get(c.kind, 0) + 1
+        return counts
+
+    def __repr__(self):
+        return f"<TreeDiff {self.summary()}>"
+
+
+def diff_trees(old, new):
+    """Return the TreeDiff turning snapshot ``old`` into ``new``."""
+    changes = []
+    added = {}    # con id -> (node, (parent id, floating))
+    removed = {}  # con id -> (node, (parent id, floating))
+
+    if old is None or new is None:
+        if new is not None:
+            _collect(new, None, added)
+        if old is not None:
+            _collect(old, None, removed)
+    elif old.id != new.id:
+        _collect(new, None, added)
+        _collect(old, None, removed)
+    else:
+        _walk(old, new, changes, added, removed)
+
+    # A node that left one parent and appeared under another was moved
+    for con_id in [i for i in added if i in removed]:
+        new_node, new_parent = added.pop(con_id)
+        old_node, old_parent = removed.pop(con_id)
+        if new_parent != old_parent:
+            changes.append(Change(MOVED, con_id, old_node, new_node))
+        _compare(old_node, new_node, changes)
+
+    changes.extend(Change(ADDED, i, None, node) for i, (node, _) in added.items())
+    changes.extend(Change(REMOVED, i, node, None) for i, (node, _) in removed.items())
+    return TreeDiff(changes)
+
+
+def _collect(node, parent, into):
+    # ``parent`` is (parent id, floating), so tiling <-> floating is a move too
+    into[node.id] = (node, parent)
+    for child in node.nodes:
+        _collect(child, (node.id, False), into)
+    for child in node.floating_nodes:
+        _collect(child, (node.id, True), into)
+
+
+def _compare(a, b, changes):
+    """Classify changes to a node's own fields (not its children)."""
+    if a.name != b.name or a.app_id != b.app_id:
+        changes.append(Change(RETITLED, b.id, a, b))
+    if a.marks != b.marks:
+        changes.append(Change(MARKED, b.id, a, b))
+    if a.rect != b.rect:
+        changes.append(Change(RESIZED, b.id, a, b))
+    if a.layout != b.layout or a.type != b.type:
+        changes.append(Change(LAYOUT_CHANGED, b.id, a, b))
+    if a.focused != b.focused or a.focus != b.focus:
+        changes.append(Change(FOCUS_CHANGED, b.id, a, b))
+
+
+def _walk(a, b, changes, added, removed):
+    if a is b:
+        return  # Shared subtree: nothing below here changed
+    _compare(a, b, changes)
+
+    for floating, old_list, new_list in ((False, a.nodes, b.nodes),
+                                         (True, a.floating_nodes, b.floating_nodes)):
+        if old_list is new_list:
+            continue
+        old_by_id = {c.id: c for c in old_list}
+        new_by_id = {c.id: c for c in new_list}
+
+        for child in new_list:
+            prev = old_by_id.get(child.id)
+            if prev is None:
+                _collect(child, (b.id, floating), added)
+            else:
+                _walk(prev, child, changes, added, removed)
+        for child in old_list:
+            if child.id not in new_by_id:
+                _collect(child, (a.id, floating), removed)
+
+        # Reordered siblings (ignoring ones that came or went)
+        old_order = [c.id for c in old_list if c.id in new_by_id]
+        new_order = [c.id for c in new_list if c.id in old_by_id]
+        if old_order != new_order:
+            for i, con_id in enumerate(new_order):
+                if old_order[i] != con_id:
+                    changes.append(Change(MOVED, con_id, old_by_id[con_id], new_by_id[con_id]))
@@ -0,0 +1,132 @@
+"""Headless export of layout snapshots.
+
+Renders a tree through the same LayoutEngine and painters the viewer uses,
+onto cairo image/vector surfaces instead of a Gtk.DrawingArea, or dumps the
+computed boxes as JSON. Nothing here imports GTK.
+"""
+import json
+import os
+import re
+
+import cairo
+
+from layout import LayoutEngine, OP_FILL, OP_BORDER, workspace_frame, overview_frame
+from render import paint_layout, paint_background, paint_breadcrumb
+
+FORMATS = ("png", "svg", "pdf", "json")
+
+
+def format_for(path, default=None):
+    """Guess the output format from a file extension."""
+    ext = os.path.splitext(path)[1].lstrip(".").lower()
+    if ext in FORMATS:
+        return ext
+    if default:
+        return default
+    raise ValueError(f"Cannot tell the export format of {path!r} (use one of {', '.join(FORMATS)})")
+
+
+def breadcrumb(path):
+    return " > ".join([n.name or n.type for n in path]) if path else "Root"
+
+
+def layout_to_dict(layout):
+    """Plain-data version of a Layout: one entry per box, in paint order."""
+    # A box's FILL and BORDER enclose the ops of its children, so the
+    # innermost open box is the parent
+    boxes = []
+    open_ids = []
+    for op, box in layout.ops:
+        if op == OP_BORDER:
+            open_ids.pop()
+            continue
+        if op != OP_FILL:
+            continue
+        boxes.append({
+            "id": box.node_id,
+            "parent": open_ids[-1] if open_ids else None,
+            "x": round(box.x, 2),
+            "y": round(box.y, 2),
+            "width": round(box.w, 2),
+            "height": round(box.h, 2),
+            "label": box.label,
+            "focused": box.focused,
+            "leaf": box.is_leaf,
+        })
+        open_ids.append(box.node_id)
+    return boxes
+
+
+class Exporter:
+    """Lays out and writes snapshots of a TreeModel."""
+
+    def __init__(self, model, width=1600, height=900, mode="window",
+                 include_floating=False, alpha=1.0):
+        self.model = model
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.alpha = alpha
+        self.engine = LayoutEngine(include_floating=include_floating)
+
+    def layout_for(self, workspace, overview=False):
+        header = self.mode == "window"
+        if overview:
+            x, y, w, h = overview_frame(self.width, self.height, header)
+            return self.engine.layout_overview(self.model.root, x, y, w, h)
+        x, y, w, h = workspace_frame(workspace.rect, self.width, self.height, header)
+        return self.engine.layout_node(workspace, x, y, w, h)
+
+    def paint(self, ctx, layout, title):
+        paint_background(ctx, self.mode == "transparent")
+        if self.mode == "window":
+            paint_breadcrumb(ctx, title, self.width)
+        paint_layout(ctx, layout, self.alpha)
+
+    def export(self, path, workspace=None, overview=False, fmt=None):
+        """Write one snapshot. Defaults to the focused workspace."""
+        fmt = fmt or format_for(path)
+        if workspace is None and not overview:
+            workspace, _ = self.model.focused_view()
+            if workspace is None:
+                raise ValueError("The tree has no focused workspace")
+
+        layout = self.layout_for(workspace, overview)
+        title = "Overview" if overview else breadcrumb(self.model.path_to(workspace.id))
+
+        if fmt == "json":
+            data = {
+                "workspace": None if overview else workspace.name,
+                "width": self.width,
+                "height": self.height,
+                "boxes": layout_to_dict(layout),
+            }
+            with open(path, "w") as f:
+                json.dump(data, f, indent=1)
+            return
+
+        if fmt == "png":
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, self.width, self.height)
+        elif fmt == "svg":
+            surface = cairo.SVGSurface(path, self.width, self.height)
+        elif fmt == "pdf":
+            surface = cairo.PDFSurface(path, self.width, self.height)
+        else:
+            raise ValueError(f"Unknown export format {fmt!r}")
+
+        self.paint(cairo.Context(surface), layout, title)
+        if fmt == "png":
+            surface.write_to_png(path)
+        surface.finish()
+
+    def export_all(self, directory, fmt="png"):
+        """Write one file per workspace into ``directory``; returns the paths."""
+        os.makedirs(directory, exist_ok=True)
+        written = []
+        for ws in self.model.workspaces():
+            # Workspace names may contain anything sway allows, including "/"
+            name = re.sub(r"[^\w.-]+", "_", ws.name or str(ws.id)).strip("_") or str(ws.id)
+            path = os.path.join(directory, f"{name}.{fmt}")
+            self.export(path, workspace=ws, fmt=fmt)
+            written.append(path)
+        return written
@@ -1,19 +1,46 @@
 import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, Gdk, GLib
-import cairo
-
-# Layout Constants
-PAD = 5
-HEADER_H = 20
+import time
+
+from diff import FOCUS_CHANGED
+from hittest import SpatialIndex
+from metrics import metrics
+from layout import LayoutEngine, interpolate, workspace_frame, overview_frame
+from render import (paint_layout, paint_background, paint_breadcrumb, paint_hud,
+                    paint_drop_target, paint_dim, paint_highlight, paint_search_bar,
+                    RetainedRenderer, SurfaceCache)
+
+# Pixels the pointer must travel with the button held before it is a drag
+DRAG_THRESHOLD = 8
+# Temporary mark used to move a container next to another one
+DROP_MARK = "_swaytreeviewer_drop"
+
+# Tree diffs kept between two frames before giving up on partial repaints
+MAX_PENDING_DIFFS = 8
+
+SELECTION_COLOR = (1.0, 0.85, 0.3)
+
+# Arrow keys move the keyboard selection through the tree
+NAVIGATION_KEYS = {
+    Gdk.KEY_Up: "parent",
+    Gdk.KEY_Down: "child",
+    Gdk.KEY_Left: "previous",
+    Gdk.KEY_Right: "next",
+}
+MATCH_COLOR = (0.3, 0.9, 0.5)
 
 class TreeVisualizer(Gtk.Window):
-    def __init__(self, mode="window", include_floating=False, alpha=0.5, width="100%", height="100%"):
+    def __init__(self, mode="window", include_floating=False, alpha=0.5, width="100%", height="100%",
+                 cache_budget=64 * 1024 * 1024, resident=False, overview=False, animation_ms=120):
         super().__init__(title="SwayTreeViewer")
         self.set_wmclass("swaytreeviewer", "SwayTreeViewer")
         self.mode = mode
         self.include_floating = include_floating
         self.alpha = alpha
+        self.resident = resident # Daemon mode: hide instead of closing
+        self.overview = overview # Show every output and workspace at once
+        self.on_overview_changed = None # Called with the new state when toggled
         
         # Calculate actual dimensions
         final_w, final_h = self._calculate_dimensions(width, height)
@@ -41,13 +68,55 @@ class TreeVisualizer(Gtk.Window):
         
         # Handle key press events
         self.connect("key-press-event", self.on_key_press)
+        self.connect("delete-event", self.on_delete)
         
         self.drawing_area = Gtk.DrawingArea()
         self.drawing_area.connect("draw", self.on_draw)
         self.add(self.drawing_area)
+
+        # Pointer: click to focus, drag to move, hover for details
+        self.drawing_area.add_events(Gdk.EventMask.BUTTON_PRESS_MASK |
+                                     Gdk.EventMask.BUTTON_RELEASE_MASK |
+                                     Gdk.EventMask.POINTER_MOTION_MASK)
+        self.drawing_area.connect("button-press-event", self.on_button_press)
+        self.drawing_area.connect("button-release-event", self.on_button_release)
+        self.drawing_area.connect("motion-notify-event", self.on_motion)
+        self.drawing_area.set_has_tooltip(True)
+        self.drawing_area.connect("query-tooltip", self.on_query_tooltip)
+        self.on_command = None  # Called with a sway command string (set by main)
+        self._hit_index = None
+        self._node_index = {}
+        self._node_index_version = None
+        self._drag = None       # [con id, start x, start y, dragging]
+        self._drop_box = None   # Box under the pointer while dragging
         
-        self.current_tree = None
-        self.focused_workspace_name = None
+        self.current_workspace = None
+        self.current_path = []
+        self.tree_version = 0
+        self.layout_engine = LayoutEngine(include_floating=include_floating)
+        self._painted_layout = None  # Last layout replayed by on_draw
+
+        # Frame pacing: updates are applied on the next frame clock tick, so
+        # any number of updates between two frames costs one layout + redraw
+        self.animation_ms = animation_ms  # Move/resize transition length (0 = jump)
+        self._tick_id = None
+        self._anim = None          # (from layout, to layout, start time in s)
+        self._frame_layout = None  # Layout shown by the current frame
+        self._header_dirty = False
+        self._pending_diffs = None  # TreeDiffs since the last frame (None: unknown)
+        self.renderer = RetainedRenderer(SurfaceCache(budget=cache_budget))
+
+        # Performance overlay (toggled with 'h')
+        self.hud = False
+        self._hud_rect = None
+        self._hud_timer = None
+
+        # Keyboard selection and search ('/')
+        self.search_index = None  # search.SearchIndex, kept current by the listener
+        self.search_query = None  # None when not searching
+        self.search_matches = []
+        self.selected_id = None   # Container the arrow keys move from
+        self._parent_index = {}
 
     def _calculate_dimensions(self, w_str, h_str):
         """Parse width/height strings (pixels or percentage) and return pixels."""
@@ -68,305 +137,473 @@ class TreeVisualizer(Gtk.Window):
 
         return parse_dim(w_str, monitor_w), parse_dim(h_str, monitor_h)
 
-    def update_tree(self, tree, focused_ws_name):
-        self.current_tree = tree
-        self.focused_workspace_name = focused_ws_name
-        self.queue_draw()
-
-    def find_node_by_name(self, node, name):
-        if node.name == name and node.type == 'workspace':
-            return node
-        
-        children = node.nodes
-        if self.include_floating:
-            children = children + node.floating_nodes
+    def update_tree(self, workspace, path, diff=None):
+        """Receive the focused workspace subtree and its path from the root.
+
+        ``diff`` (a diff.TreeDiff, if known) limits the repaint to the boxes
+        of the containers that changed.
+        """
+        old_breadcrumb = self._breadcrumb()
+        self.current_workspace = workspace
+        self.current_path = path
+        self.tree_version += 1
+
+        # A hidden (resident) window gets a full draw when it is shown again
+        if not self.get_visible():
+            self._painted_layout = None
+            self._frame_layout = None
+            self._anim = None
+            return
 
-        for child in children:
-            res = self.find_node_by_name(child, name)
-            if res: return res
-        return None
+        if self._breadcrumb() != old_breadcrumb:
+            self._header_dirty = True
+        if self.search_query is not None:
+            self._run_search()
+        # Collect the changes of every update until the next frame. Diffs
+        # reference old snapshots, so if frames stall (e.g. the compositor
+        # throttles an occluded window) fall back to a full redraw instead
+        # of pinning an unbounded number of trees.
+        if diff is None or (self._pending_diffs is not None and
+                            len(self._pending_diffs) >= MAX_PENDING_DIFFS):
+            self._pending_diffs = None
+        elif self._pending_diffs is not None:
+            self._pending_diffs.append(diff)
+        self._schedule_frame()
+
+    def _schedule_frame(self):
+        """Apply the latest state on the next frame clock tick."""
+        if self._tick_id is None:
+            self._tick_id = self.drawing_area.add_tick_callback(self._on_tick)
+
+    def _on_tick(self, widget, frame_clock):
+        now = frame_clock.get_frame_time() / 1e6
+        target = self._current_layout()
+        if target is None:
+            self._tick_id = None
+            return False
+
+        # Updates that arrived since the last frame were never laid out; only
+        # the newest state becomes the target, starting from what is on screen.
+        shown = self._frame_layout or self._painted_layout
+        changed_ids = None  # Known when only labels/focus changed
+        if self._anim is None or self._anim[1] is not target:
+            diffs = self._pending_diffs
+            self._pending_diffs = []
+            geometric = diffs is None or any(d.geometric for d in diffs)
+            if (geometric and self.animation_ms > 0 and shown is not target
+                    and self._can_animate(shown, target)):
+                self._anim = (shown, target, now)
+            else:
+                self._anim = None
+            if not geometric and self._same_frame(shown, target):
+                changed_ids = self._repaint_ids(diffs)
+
+        if self._anim is not None:
+            start_layout, end_layout, start = self._anim
+            t = (now - start) * 1000 / self.animation_ms
+            if t >= 1:
+                self._anim = None
+                frame = end_layout
+            else:
+                t = 1 - (1 - t) ** 3  # Ease out
+                frame = interpolate(start_layout, end_layout, t)
+        else:
+            frame = target
 
-    def get_node_path(self, root, target_id):
-        if root.id == target_id:
-            return [root]
-        
-        children = root.nodes
-        if self.include_floating:
-            children = children + root.floating_nodes
-
-        for child in children:
-            path = self.get_node_path(child, target_id)
-            if path:
-                return [root] + path
-        return None
+        # Only invalidate the rectangles that actually changed
+        if changed_ids is not None and frame is target:
+            rects = frame.extents_for(changed_ids, shown)
+        else:
+            rects = frame.changed_extents(shown)
+        self._frame_layout = frame
+        if rects is None:
+            self.drawing_area.queue_draw()
+        else:
+            if self.mode == "window" and self._header_dirty:
+                rects.append((0, 0, self.drawing_area.get_allocated_width(), 30))
+            for rect in rects:
+                self.drawing_area.queue_draw_area(*rect)
+        self._header_dirty = False
+
+        if self._anim is None:
+            self._tick_id = None
+            return False
+        return True
+
+    def _can_animate(self, old, new):
+        # Only moves and resizes inside the same view are animated; switching
+        # workspaces or modes jumps straight to the new layout.
+        if old is None or not old.ops or not new.ops:
+            return False
+        return old.ops[0][1].node_id == new.ops[0][1].node_id
+
+    def _repaint_ids(self, diffs):
+        ids = set()
+        for diff in diffs:
+            for change in diff:
+                # Reordered focus stacks are invisible outside tabs/stacks
+                # (and those count as geometric); only the focused flag shows.
+                if change.kind == FOCUS_CHANGED and change.old.focused == change.new.focused:
+                    continue
+                ids.add(change.con_id)
+        return ids
+
+    def _same_frame(self, old, new):
+        # Same view at the same size: only boxes named in the diff can differ
+        if not self._can_animate(old, new):
+            return False
+        a, b = old.ops[0][1], new.ops[0][1]
+        return (a.x, a.y, a.w, a.h) == (b.x, b.y, b.w, b.h)
 
     def on_key_press(self, widget, event):
         """Handle key press events."""
+        if self.search_query is not None:
+            return self._on_search_key(event)
+        if event.keyval == Gdk.KEY_slash:
+            self.search_query = ""
+            self._run_search()
+            return True
+        if event.keyval in NAVIGATION_KEYS:
+            self._navigate(NAVIGATION_KEYS[event.keyval])
+            return True
+        if event.keyval in (Gdk.KEY_Return, Gdk.KEY_KP_Enter) and self.selected_id:
+            self._command(f"[con_id={self.selected_id}] focus")
+            return True
         if event.keyval == Gdk.KEY_Escape:
-            self.destroy()
+            if self.resident:
+                self.hide()
+            else:
+                self.destroy()
+            return True
+        if event.keyval == Gdk.KEY_o:
+            self.set_overview(not self.overview)
+            return True
+        if event.keyval == Gdk.KEY_h:
+            self.set_hud(not self.hud)
             return True
         return False
 
-    def on_draw(self, widget, ctx):
-        # 1. Clear/Draw Window Background
-        if self.mode == "transparent":
-            # Clear background fully for transparency
-            ctx.set_source_rgba(0, 0, 0, 0)
-            ctx.set_operator(cairo.OPERATOR_SOURCE)
-            ctx.paint()
-            ctx.set_operator(cairo.OPERATOR_OVER)
+    # ----- Search and keyboard navigation -----
+
+    def _on_search_key(self, event):
+        key = event.keyval
+        if key == Gdk.KEY_Escape:
+            self.search_query = None
+            self.search_matches = []
+        elif key in (Gdk.KEY_Return, Gdk.KEY_KP_Enter):
+            if self.selected_id:
+                self._command(f"[con_id={self.selected_id}] focus")
+            self.search_query = None
+            self.search_matches = []
+        elif key == Gdk.KEY_BackSpace:
+            self.search_query = self.search_query[:-1]
+            self._run_search()
+        elif key in (Gdk.KEY_Tab, Gdk.KEY_Down):
+            self._cycle_match(1)
+        elif key in (Gdk.KEY_ISO_Left_Tab, Gdk.KEY_Up):
+            self._cycle_match(-1)
         else:
-            # Standard dark background
-            ctx.set_source_rgb(0.15, 0.15, 0.15)
-            ctx.paint()
+            char = Gdk.keyval_to_unicode(key)
+            if char < 32:
+                return False
+            self.search_query += chr(char)
+            self._run_search()
+        self.drawing_area.queue_draw()
+        return True
+
+    def _run_search(self):
+        if self.search_index is None:
+            self.search_matches = []
+            return
+        self.search_matches = self.search_index.search(self.search_query)
+        if self.search_matches and self.selected_id not in self.search_matches:
+            self.selected_id = self.search_matches[0]
+        self.drawing_area.queue_draw()
 
-        if not self.current_tree or not self.focused_workspace_name:
+    def _cycle_match(self, step):
+        if not self.search_matches:
             return
+        try:
+            i = self.search_matches.index(self.selected_id) + step
+        except ValueError:
+            i = 0
+        self.selected_id = self.search_matches[i % len(self.search_matches)]
+
+    def _initial_selection(self):
+        # Follow the workspace's focus stack, skipping the viewer's own window
+        node = self.current_workspace
+        while node is not None:
+            candidates = (self.node(i) for i in node.focus)
+            child = next((c for c in candidates
+                          if c is not None and c.name != self.get_title()), None)
+            if child is None:
+                return node.id
+            node = child
+        return None
 
-        ws_node = self.find_node_by_name(self.current_tree, self.focused_workspace_name)
-
-        if ws_node:
-            w_width = widget.get_allocated_width()
-            w_height = widget.get_allocated_height()
-            
-            avail_y = 5 # Default small padding
-            
-            # Header Breadcrumbs (Only in Window mode)
-            if self.mode == "window":
-                path = self.get_node_path(self.current_tree, ws_node.id)
-                path_str = " > ".join([n.name or n.type for n in path]) if path else "Root"
-                
-                ctx.save()
-                ctx.set_source_rgb(0.8, 0.8, 0.8)
-                ctx.select_font_face("Sans", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_BOLD)
-                ctx.set_font_size(12)
-                ctx.move_to(10, 20)
-                ctx.show_text(path_str)
-                ctx.restore()
-                
-                avail_y = 30
-            
-            # Available area for the tree
-            avail_h = w_height - avail_y - 10
-            avail_w = w_width - 20
-            
-            # Aspect Ratio Correction
-            # Get actual workspace geometry
-            ws_rect = ws_node.rect
-            if ws_rect.width and ws_rect.height:
-                ws_ratio = ws_rect.width / ws_rect.height
-                win_ratio = avail_w / avail_h
-                
-                final_w = avail_w
-                final_h = avail_h
-                
-                if ws_ratio > win_ratio:
-                    # Workspace is wider than window: constrain by width
-                    final_h = avail_w / ws_ratio
-                else:
-                    # Workspace is taller than window: constrain by height
-                    final_w = avail_h * ws_ratio
-                
-                # Center it
-                offset_x = 10 + (avail_w - final_w) / 2
-                offset_y = avail_y + (avail_h - final_h) / 2
-                
-                self.draw_node_recursive(ctx, ws_node, offset_x, offset_y, final_w, final_h)
-            else:
-                # Fallback if no geometry info
-                self.draw_node_recursive(ctx, ws_node, 10, avail_y, avail_w, avail_h)
+    def _navigate(self, direction):
+        """Move the keyboard selection; Enter focuses it."""
+        node = self.node(self.selected_id)
+        if node is None:
+            self.selected_id = self._initial_selection()
+            self.drawing_area.queue_draw()
+            return
+        parent = self.node(self._parent_index.get(node.id))
+
+        target = None
+        if direction == "parent":
+            if node.type != "workspace":
+                target = parent
+        elif direction == "child":
+            kids = node.children()
+            if kids:
+                by_id = {c.id: c for c in kids}
+                target = next((by_id[i] for i in node.focus if i in by_id), kids[0])
+        elif parent is not None:
+            siblings = parent.children()
+            i = next(i for i, c in enumerate(siblings) if c.id == node.id)
+            step = 1 if direction == "next" else -1
+            target = siblings[(i + step) % len(siblings)]
+
+        if target is not None and target.type not in ("root", "output"):
+            self.selected_id = target.id
+            self.drawing_area.queue_draw()
+
+    def set_hud(self, enabled):
+        """Show or hide the performance overlay."""
+        self.hud = enabled
+        if enabled and self._hud_timer is None:
+            # Rates and timings change without any tree update
+            self._hud_timer = GLib.timeout_add(500, self._on_hud_timer)
+        elif not enabled and self._hud_timer is not None:
+            GLib.source_remove(self._hud_timer)
+            self._hud_timer = None
+        self.drawing_area.queue_draw()
+
+    def _on_hud_timer(self):
+        if self._hud_rect and self.get_visible():
+            self.drawing_area.queue_draw_area(*self._hud_rect)
+        return True
+
+    # ----- Pointer interaction -----
+
+    def box_at(self, x, y):
+        """The innermost box on screen under (x, y), or None."""
+        layout = self._frame_layout or self._painted_layout
+        if layout is None:
+            return None
+        if self._hit_index is None or self._hit_index.layout is not layout:
+            self._hit_index = SpatialIndex(layout)
+        return self._hit_index.box_at(x, y)
+
+    def node(self, con_id):
+        """Look up a node of the current tree by con id."""
+        if self._node_index_version != self.tree_version:
+            # Built at most once per tree version, and only when needed
+            self._node_index = {}
+            self._parent_index = {}
+            stack = [self.current_path[0]] if self.current_path else []
+            while stack:
+                node = stack.pop()
+                self._node_index[node.id] = node
+                for child in node.children():
+                    self._parent_index[child.id] = node.id
+                    stack.append(child)
+            self._node_index_version = self.tree_version
+        return self._node_index.get(con_id)
+
+    def _command(self, cmd):
+        if self.on_command:
+            self.on_command(cmd)
+
+    def on_query_tooltip(self, widget, x, y, keyboard_mode, tooltip):
+        box = self.box_at(x, y)
+        node = self.node(box.node_id) if box is not None else None
+        if node is None:
+            return False
+        lines = [node.name or node.type]
+        if node.app_id:
+            lines.append(f"app_id: {node.app_id}")
+        if node.pid:
+            lines.append(f"pid: {node.pid}")
+        if node.marks:
+            lines.append(f"marks: {', '.join(node.marks)}")
+        lines.append(f"con_id: {node.id}")
+        tooltip.set_text("\n".join(lines))
+        return True
+
+    def on_button_press(self, widget, event):
+        if event.button != 1:
+            return False
+        box = self.box_at(event.x, event.y)
+        self._drag = [box.node_id, event.x, event.y, False] if box is not None else None
+        return True
+
+    def on_motion(self, widget, event):
+        if self._drag is None:
+            return False
+        con_id, x0, y0, dragging = self._drag
+        if not dragging:
+            if abs(event.x - x0) + abs(event.y - y0) < DRAG_THRESHOLD:
+                return True
+            self._drag[3] = True
+
+        box = self.box_at(event.x, event.y)
+        if box is not None and not self._can_drop(con_id, box.node_id):
+            box = None
+        if box is not self._drop_box:
+            for old in (self._drop_box, box):
+                if old is not None:
+                    self.drawing_area.queue_draw_area(*old.extents(margin=3))
+            self._drop_box = box
+        return True
+
+    def on_button_release(self, widget, event):
+        if event.button != 1 or self._drag is None:
+            return False
+        con_id, _, _, dragging = self._drag
+        target = self._drop_box
+        self._drag = None
+        if target is not None:
+            self.drawing_area.queue_draw_area(*target.extents(margin=3))
+            self._drop_box = None
+
+        if not dragging:
+            self._command(f"[con_id={con_id}] focus")
+        elif target is not None:
+            self._command(self._move_command(con_id, target.node_id))
+        return True
+
+    def _can_drop(self, con_id, target_id):
+        node = self.node(con_id)
+        target = self.node(target_id)
+        if node is None or target is None or node.type in ("root", "output", "workspace"):
+            return False
+        if target.type == "root":
+            return False
+        # Not onto itself or into its own subtree
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            if n.id == target_id:
+                return False
+            stack.extend(n.children())
+        return True
+
+    def _move_command(self, con_id, target_id):
+        target = self.node(target_id)
+        name = (target.name or "").replace('"', '\\"')
+        if target.type == "workspace":
+            return f'[con_id={con_id}] move container to workspace "{name}"'
+        if target.type == "output":
+            return f'[con_id={con_id}] move container to output "{name}"'
+        return (f"[con_id={target_id}] mark --add {DROP_MARK}; "
+                f"[con_id={con_id}] move container to mark {DROP_MARK}; "
+                f"[con_id={target_id}] unmark {DROP_MARK}")
+
+    def set_overview(self, enabled):
+        """Switch between the focused workspace and the all-workspaces overview."""
+        self.overview = enabled
+        if self.on_overview_changed:
+            self.on_overview_changed(enabled)
+        self._painted_layout = None
+        self._frame_layout = None
+        self._anim = None
+        self.drawing_area.queue_draw()
+
+    def on_theme_changed(self):
+        """Repaint everything after the theme file was reloaded."""
+        self.renderer.cache.clear()
+        self._painted_layout = None
+        self._frame_layout = None
+        self._anim = None
+        self.drawing_area.queue_draw()
+
+    def on_delete(self, widget, event):
+        """Closing a resident window only hides it."""
+        if self.resident:
+            self.hide()
+            return True
+        return False
 
-    def draw_node_recursive(self, ctx, node, x, y, w, h):
-        if w <= 0 or h <= 0: return
+    def _current_layout(self):
+        """Layout for the current tree and allocation (cached by the engine)."""
+        if not self.current_workspace:
+            return None
+        w_width = self.drawing_area.get_allocated_width()
+        w_height = self.drawing_area.get_allocated_height()
+        header = self.mode == "window"
+        if self.overview and self.current_path:
+            # The path starts at the root, which holds every output
+            x, y, w, h = overview_frame(w_width, w_height, header)
+            return self.layout_engine.layout(self.tree_version, self.current_path[0],
+                                             x, y, w, h, overview=True)
+        x, y, w, h = workspace_frame(self.current_workspace.rect, w_width, w_height, header)
+        return self.layout_engine.layout(self.tree_version, self.current_workspace, x, y, w, h)
+
+    def _breadcrumb(self):
+        if self.overview:
+            return "Overview"
+        path = self.current_path
+        return " > ".join([n.name or n.type for n in path]) if path else "Root"
 
-        is_leaf = len(node.nodes) == 0
-        
-        # Colors (Polished)
-        border_color = (0.3, 0.3, 0.3)
-        border_width = 1
-        # Apply alpha to background colors
-        bg_color = (0.1, 0.1, 0.1, 1.0 * self.alpha) # Dark background for containers
-
-        if node.focused:
-            border_color = (0.3, 0.7, 1.0) # Soft Blue
-            border_width = 2
-            bg_color = (0.1, 0.2, 0.3, 1.0 * self.alpha) # Dark Blue tint
-        elif is_leaf:
-            bg_color = (0.18, 0.18, 0.18, 1.0 * self.alpha) # Slightly lighter for windows
-
-        # 1. Draw Background (Bottom Layer)
-        ctx.save()
-        ctx.rectangle(x, y, w, h)
-        ctx.set_source_rgba(*bg_color)
-        ctx.fill() # Only fill
-        ctx.restore()
-
-        # Determine Label
-        label = ""
-        if node.type == 'workspace':
-            label = f"WS: {node.name}"
-        elif node.type == 'con':
-            if is_leaf:
-                label = node.name if node.name else "unnamed"
-            else:
-                label = f"{node.layout}"
-        elif node.type == 'floating_con':
-            label = "Float"
-        
-        # 2. Draw Header Label (Middle Layer A)
-        # Use a dynamic header height based on size, but clamped
-        
-        # FIX: If the node is very small (likely a tab or collapsed stack item),
-        # force the header to fill the space so text is visible.
-        if h < HEADER_H * 1.5:
-             header_h = h - 2 # Use almost full height
+    def on_draw(self, widget, ctx):
+        frame_start = time.perf_counter()
+
+        # 1. Clear/Draw Window Background
+        paint_background(ctx, self.mode == "transparent")
+
+        # While a frame is pending or animating, paint what the frame clock
+        # picked; otherwise (expose, resize) paint the current state.
+        if self._tick_id is not None and self._frame_layout is not None:
+            layout = self._frame_layout
         else:
-             header_h = min(HEADER_H, h * 0.3) 
-        
-        if header_h > 8: # Only draw header if space permits
-            ctx.save()
-            ctx.rectangle(x, y, w, header_h)
-            ctx.clip()
-            
-            # Text Color
-            text_color = (0.7, 0.7, 0.7)
-            if node.focused: text_color = (1.0, 1.0, 1.0)
-            
-            # Center vertically in the header strip
-            ctx.move_to(x + 4, y + (header_h / 2) + 4) 
-            
-            ctx.set_source_rgba(*text_color, self.alpha)
-            ctx.select_font_face("Sans", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_BOLD)
-            ctx.set_font_size(min(10, header_h - 2))
-            ctx.show_text(label)
-            ctx.restore()
-
-        # Calculate Content Area for Children
-        # If header was too small, don't reserve space for it
-        effective_header_h = header_h if header_h > 8 else 0
-        
-        # If this is a "Collapsed" view (header takes up most space), don't draw content
-        if h < HEADER_H * 1.5:
-            effective_header_h = h # Consume all space
-        
-        cx = x + PAD
-        cy = y + effective_header_h
-        cw = w - (2 * PAD)
-        ch = h - effective_header_h - PAD
-
-        if cw > 0 and ch > 0:
-            # 3. Recurse for Children (Middle Layer B)
-            if not is_leaf:
-                children = node.nodes
-                count = len(children)
-                if count > 0:
-                    # Layout Logic
-                    if node.layout in ['splith', 'splitv']:
-                        # Calculate total size in Sway units to determine ratios
-                        # Note: node.rect might not exactly match sum of children due to borders/gaps in sway
-                        # So we sum children.
-                        total_sway_size = 0
-                        if node.layout == 'splith':
-                            total_sway_size = sum(c.rect.width for c in children)
-                        else:
-                            total_sway_size = sum(c.rect.height for c in children)
-                        
-                        if total_sway_size == 0: total_sway_size = 1 # avoid div/0
-
-                        curr_pos = 0
-                        for child in children:
-                            ratio = 0
-                            if node.layout == 'splith':
-                                ratio = child.rect.width / total_sway_size
-                                child_w = cw * ratio
-                                self.draw_node_recursive(ctx, child, cx + curr_pos, cy, child_w, ch)
-                                curr_pos += child_w
-                            else: # splitv
-                                ratio = child.rect.height / total_sway_size
-                                child_h = ch * ratio
-                                self.draw_node_recursive(ctx, child, cx, cy + curr_pos, cw, child_h)
-                                curr_pos += child_h
-
-                    elif node.layout in ['tabbed', 'stacked']:
-                        # Identify Active Child
-                        active_child = None
-                        if node.focus:
-                            active_id = node.focus[0]
-                            active_child = next((c for c in children if c.id == active_id), children[0])
-                        else:
-                            active_child = children[0]
-
-                        TAB_SIZE = 22 # Height of headers
-                        
-                        if node.layout == 'tabbed':
-                            # TABBED: Top Horizontal Strip for Headers + Main Area for Active Content
-                            tab_w = cw / count
-                            
-                            # 1. Draw All Tabs (Inactive headers)
-                            # We draw the active tab here too as a marker?
-                            # Yes, draw all as headers in the strip.
-                            for i, child in enumerate(children):
-                                tx = cx + (i * tab_w)
-                                ty = cy
-                                tw = tab_w
-                                th = TAB_SIZE
-                                
-                                if child == active_child:
-                                    # Highlight Active Tab
-                                    ctx.save()
-                                    ctx.rectangle(tx, ty, tw, th)
-                                    ctx.set_source_rgba(0.2, 0.6, 1.0, self.alpha) # Blue
-                                    ctx.fill()
-                                    # Add label explicitly? No, draw_node_recursive below will handle frame/label if we call it.
-                                    # But we want to draw the BODY primarily.
-                                    # Let's draw a "Tab Marker" here.
-                                    ctx.restore()
-                                else:
-                                    # Draw Inactive Tab (Recurse -> renders frame/header)
-                                    self.draw_node_recursive(ctx, child, tx, ty, tw, th)
-
-                            # 2. Draw Active Body
-                            body_y = cy + TAB_SIZE
-                            body_h = ch - TAB_SIZE
-                            if body_h > 0:
-                                self.draw_node_recursive(ctx, active_child, cx, body_y, cw, body_h)
-
-                        else: 
-                            # STACKED: Accordion (Vertical List)
-                            # Inactive get Header height. Active gets remaining.
-                            
-                            inactive_count = count - 1
-                            req_header_space = inactive_count * TAB_SIZE
-                            
-                            # Header height for inactive nodes
-                            h_h = TAB_SIZE
-                            if req_header_space > ch * 0.6: # If headers take > 60% of space, compress
-                                h_h = (ch * 0.6) / inactive_count if inactive_count > 0 else TAB_SIZE
-
-                            curr_y = cy
-                            for child in children:
-                                if child == active_child:
-                                    # Active gets remaining space
-                                    rem_h = ch - (inactive_count * h_h)
-                                    self.draw_node_recursive(ctx, child, cx, curr_y, cw, rem_h)
-                                    curr_y += rem_h
-                                else:
-                                    # Inactive gets header space
-                                    self.draw_node_recursive(ctx, child, cx, curr_y, cw, h_h)
-                                    curr_y += h_h
-
-            if self.include_floating:
-                for child in node.floating_nodes:
-                    fw = w * 0.5
-                    fh = h * 0.5
-                    fx = x + (w - fw) / 2
-                    fy = y + (h - fh) / 2
-                    self.draw_node_recursive(ctx, child, fx, fy, fw, fh)
-
-        # 4. Draw Border (Top Layer - Ensures Focus is Visible)
-        ctx.save()
-        ctx.rectangle(x, y, w, h)
-        ctx.set_source_rgba(*border_color, self.alpha)
-        ctx.set_line_width(border_width)
-        ctx.stroke()
-        ctx.restore()
+            layout = self._current_layout()
+            self._frame_layout = layout
+        if layout is None:
+            return
+
+        # Header Breadcrumbs (Only in Window mode)
+        if self.mode == "window":
+            paint_breadcrumb(ctx, self._breadcrumb(), widget.get_allocated_width())
+
+        paint_start = time.perf_counter()
+        if self._anim is not None:
+            # Every animation frame has new box sizes; caching their headers
+            # would only flush the cache. Paint them directly instead.
+            paint_layout(ctx, layout, self.alpha)
+        else:
+            self.renderer.paint(ctx, layout, self.alpha)
+        self._painted_layout = layout
+        metrics.record("paint", time.perf_counter() - paint_start)
+
+        if self._drop_box is not None:
+            paint_drop_target(ctx, self._drop_box)
+
+        # Search results and keyboard selection
+        if self.search_query is not None:
+            paint_dim(ctx)
+            for con_id in self.search_matches:
+                box = layout.boxes.get(con_id)
+                if box is not None and con_id != self.selected_id:
+                    paint_highlight(ctx, box, MATCH_COLOR)
+        selected = layout.boxes.get(self.selected_id)
+        if selected is not None:
+            paint_highlight(ctx, selected, SELECTION_COLOR, width=3)
+        if self.search_query is not None:
+            count = len(self.search_matches)
+            position = (self.search_matches.index(self.selected_id) + 1
+                        if self.selected_id in self.search_matches else 0)
+            paint_search_bar(ctx, f"/{self.search_query}   {position}/{count}",
+                             widget.get_allocated_width(), widget.get_allocated_height())
+
+        # 2. Performance overlay (shows the previous frame's time)
+        if self.hud:
+            self._hud_rect = paint_hud(ctx, metrics.hud_lines(), widget.get_allocated_width())
+
+        metrics.record("frame", time.perf_counter() - frame_start)
+        metrics.count("frames")
+
+    def draw_node_recursive(self, ctx, node, x, y, w, h):
+        """Lay out and paint a subtree into the given rectangle."""
+        paint_layout(ctx, self.layout_engine.layout_node(node, x, y, w, h), self.alpha)
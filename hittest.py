@@ -0,0 +1,40 @@
+"""Point queries against a Layout, for pointer interaction."""
+from layout import OP_FILL, OP_TAB
+
+# Grid cell size in pixels
+CELL = 48
+
+
+class SpatialIndex:
+    """Uniform grid over the boxes of one Layout.
+
+    Built once per layout (O(boxes x cells covered)); a lookup only scans
+    the boxes overlapping one cell, so pointer motion does not depend on
+    the size of the tree.
+    """
+
+    def __init__(self, layout, cell=CELL):
+        self.layout = layout
+        self.cell = cell
+        self._grid = {}  # (col, row) -> [op index], in paint order
+        for i, (op, box) in enumerate(layout.ops):
+            if op not in (OP_FILL, OP_TAB) or box.w <= 0 or box.h <= 0:
+                continue
+            c0, r0 = int(box.x // cell), int(box.y // cell)
+            c1, r1 = int((box.x + box.w) // cell), int((box.y + box.h) // cell)
+            for col in range(c0, c1 + 1):
+                for row in range(r0, r1 + 1):
+                    self._grid.setdefault((col, row), []).append(i)
+
+    def box_at(self, x, y):
+        """The topmost box under (x, y), or None.
+
+        Children are painted after their parents (and active tab markers
+        after the tab strip), so the last hit in paint order is the
+        innermost container.
+        """
+        for i in reversed(self._grid.get((int(x // self.cell), int(y // self.cell)), ())):
+            box = self.layout.ops[i][1]
+            if box.x <= x < box.x + box.w and box.y <= y < box.y + box.h:
+                return box
+        return None
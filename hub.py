@@ -0,0 +1,483 @@
+"""Hub: one sway subscription shared by many viewers and scripts.
+
+``main.py --hub`` runs a SwayListener and serves its tree over a Unix
+socket; viewers started with ``--backend hub`` (and scripts) connect to it
+instead of subscribing to sway and fetching trees themselves, so sway
+answers one GET_TREE per change however many clients there are.
+
+The protocol is newline-delimited JSON. A client first sends a request line:
+
+* ``get_tree``: the hub replies with the whole tree, nested like a GET_TREE
+  reply (only the fields tree.Node keeps), and closes the connection.
+* ``subscribe``: the hub sends a ``snapshot`` message, then a ``patch`` for
+  every change. Both carry flat node records whose children are con ids; a
+  patch only holds the nodes that changed (and their ancestors), plus the
+  classified changes from diff.py. A subscriber may send ``snapshot`` at any
+  time to be resent the full tree.
+
+Slow subscribers are never allowed to stall the hub: when a client's send
+buffer exceeds ``max_buffer``, its queued patches are replaced by a single
+snapshot of the latest tree, and a client that accepts no data at all for
+``stall_timeout`` seconds is disconnected.
+"""
+import json
+import socket
+import time
+from collections import deque
+
+import daemon
+from metrics import metrics
+from tree import Node, Rect, intern
+
+# Per-client send buffer, in bytes, before queued patches are dropped
+MAX_BUFFER = 4 * 1024 * 1024
+# Seconds a client may accept none of its queued data before it is dropped
+STALL_TIMEOUT = 5.0
+# Seconds between checks for stalled clients
+STALL_CHECK_INTERVAL = 1
+
+
+def socket_path():
+    """Per-session hub socket, next to the daemon control socket."""
+    return daemon.socket_path("hub")
+
+
+def _encode(message):
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+# ----- Node records -----
+
+def node_record(node):
+    """Flat, JSON-ready form of one node; children are con ids."""
+    r = node.rect
+    return {
+        "id": node.id,
+        "name": node.name,
+        "type": node.type,
+        "layout": node.layout,
+        "rect": [r.x, r.y, r.width, r.height],
+        "focused": node.focused,
+        "focus": list(node.focus),
+        "app_id": node.app_id,
+        "pid": node.pid,
+        "marks": list(node.marks),
+        "nodes": [c.id for c in node.nodes],
+        "floating_nodes": [c.id for c in node.floating_nodes],
+    }
+
+
+def node_from_record(record, lookup):
+    """Inverse of ``node_record``; ``lookup(con_id)`` returns built children."""
+    return Node(record["id"],
+                name=record["name"],
+                type=intern(record["type"]),
+                layout=intern(record["layout"]),
+                rect=Rect(*record["rect"]),
+                focused=record["focused"],
+                focus=tuple(record["focus"]),
+                nodes=tuple(lookup(i) for i in record["nodes"]),
+                floating_nodes=tuple(lookup(i) for i in record["floating_nodes"]),
+                app_id=intern(record["app_id"]),
+                pid=record["pid"],
+                marks=tuple(intern(m) for m in record["marks"]))
+
+
+def tree_dict(node):
+    """Nested GET_TREE style dict (as accepted by Node.from_dict)."""
+    data = node_record(node)
+    x, y, width, height = data["rect"]
+    data["rect"] = {"x": x, "y": y, "width": width, "height": height}
+    data["nodes"] = [tree_dict(c) for c in node.nodes]
+    data["floating_nodes"] = [tree_dict(c) for c in node.floating_nodes]
+    return data
+
+
+def changed_nodes(old, new):
+    """Nodes of snapshot ``new`` not shared with ``old``, parents first.
+
+    Snapshots are copy-on-write, so this only walks the copied paths. A
+    node that moved to another parent is sent again with its subtree.
+    """
+    found = []
+    stack = [(old, new)]
+    while stack:
+        a, b = stack.pop()
+        if a is b:
+            continue
+        found.append(b)
+        previous = {c.id: c for c in a.children()} if a is not None else {}
+        for child in reversed(b.children()):
+            stack.append((previous.get(child.id), child))
+    return found
+
+
+# ----- Server -----
+
+class _Client:
+    __slots__ = ("sock", "buf", "queue", "offset", "pending", "subscribed",
+                 "close_when_flushed", "last_progress", "read_watch", "write_watch")
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buf = bytearray()  # Unparsed request bytes
+        self.queue = deque()    # Encoded messages waiting to be sent
+        self.offset = 0         # Bytes of queue[0] already sent
+        self.pending = 0        # Unsent bytes in the queue
+        self.subscribed = False
+        self.close_when_flushed = False
+        self.last_progress = time.monotonic()
+        self.read_watch = None
+        self.write_watch = None
+
+
+class HubServer:
+    """Broadcasts a SwayListener's tree changes to subscribed clients.
+
+    Runs in the GLib main loop next to the listener: patches are computed
+    once per change from the listener's diffs and the same bytes are queued
+    for every client, each of which is written as it becomes writable.
+    """
+
+    def __init__(self, listener, path=None, max_buffer=MAX_BUFFER, stall_timeout=STALL_TIMEOUT):
+        self.listener = listener
+        self.path = path or socket_path()
+        self.max_buffer = max_buffer
+        self.stall_timeout = stall_timeout
+        self.server = daemon.UnixServer(self.path, self._on_accept, backlog=16)
+        self.clients = set()
+        self._root = None      # Snapshot the last patch ended at
+        self._seq = 0
+        self._snapshot = None  # (root, encoded snapshot message)
+        self._stall_check_id = None
+
+        # Counters
+        self.patches_sent = 0
+        self.snapshots_sent = 0
+        self.clients_dropped = 0
+
+    def start(self):
+        from gi.repository import GLib
+
+        self.server.start()
+        self._root = self.listener.model.root
+        self.listener.add_diff_listener(self._on_diff)
+        # Without new changes nothing is queued, so stalls are also checked here
+        self._stall_check_id = GLib.timeout_add_seconds(STALL_CHECK_INTERVAL,
+                                                        self._on_stall_check)
+
+    # ----- Broadcasting -----
+
+    def _on_diff(self, diff):
+        root = self.listener.model.root
+        if root is None or root is self._root:
+            return
+        base = self._seq
+        self._seq += 1
+        message = _encode({
+            "type": "patch",
+            "seq": self._seq,
+            "base": base,
+            "root": root.id,
+            "nodes": [node_record(n) for n in changed_nodes(self._root, root)],
+            "changes": [[c.kind, c.con_id] for c in diff],
+        })
+        self._root = root
+        for client in list(self.clients):
+            if client.subscribed:
+                self._queue(client, message)
+                self.patches_sent += 1
+
+    def _snapshot_message(self):
+        if self._snapshot is None or self._snapshot[0] is not self._root:
+            root = self._root
+            self._snapshot = (root, _encode({
+                "type": "snapshot",
+                "seq": self._seq,
+                "root": root.id if root is not None else None,
+                "nodes": [node_record(n) for n in changed_nodes(None, root)] if root else [],
+            }))
+        self.snapshots_sent += 1
+        return self._snapshot[1]
+
+    def _stalled(self, client):
+        return bool(client.queue) and \
+            time.monotonic() - client.last_progress > self.stall_timeout
+
+    def _drop_stalled(self, client):
+        self._drop(client)
+        self.clients_dropped += 1
+        metrics.count("hub_dropped")
+
+    def _on_stall_check(self):
+        for client in list(self.clients):
+            if self._stalled(client):
+                self._drop_stalled(client)
+        return True
+
+    def _queue(self, client, message):
+        if client.pending + len(message) > self.max_buffer and client.subscribed:
+            if self._stalled(client):
+                self._drop_stalled(client)
+                return
+            # Latest wins: one snapshot supersedes everything still queued
+            # (except a message that is already partly on the wire)
+            keep = client.queue.popleft() if client.offset else None
+            client.queue.clear()
+            client.pending = 0
+            if keep is not None:
+                client.queue.append(keep)
+                client.pending = len(keep) - client.offset
+            message = self._snapshot_message()
+            metrics.count("hub_resyncs")
+
+        if not client.queue:
+            client.last_progress = time.monotonic()
+        client.queue.append(message)
+        client.pending += len(message)
+        if client.write_watch is None:
+            from gi.repository import GLib
+            client.write_watch = GLib.io_add_watch(client.sock.fileno(), GLib.PRIORITY_DEFAULT,
+                                                   GLib.IO_OUT, self._on_writable, client)
+
+    def _on_writable(self, fd, condition, client):
+        while client.queue:
+            head = client.queue[0]
+            try:
+                sent = client.sock.send(memoryview(head)[client.offset:])
+            except BlockingIOError:
+                return True
+            except OSError:
+                client.write_watch = None
+                self._drop(client)
+                return False
+            client.last_progress = time.monotonic()
+            client.offset += sent
+            client.pending -= sent
+            if client.offset == len(head):
+                client.queue.popleft()
+                client.offset = 0
+
+        client.write_watch = None
+        if client.close_when_flushed:
+            self._drop(client)
+        return False
+
+    # ----- Connections and requests -----
+
+    def _on_accept(self, sock):
+        from gi.repository import GLib
+
+        sock.setblocking(False)
+        client = _Client(sock)
+        client.read_watch = GLib.io_add_watch(sock.fileno(), GLib.PRIORITY_DEFAULT,
+                                              GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR,
+                                              self._on_readable, client)
+        self.clients.add(client)
+        metrics.gauge("hub_clients", len(self.clients))
+
+    def _on_readable(self, fd, condition, client):
+        try:
+            chunk = client.sock.recv(4096)
+        except BlockingIOError:
+            return True
+        except OSError:
+            chunk = b""
+        if not chunk:
+            client.read_watch = None
+            self._drop(client)
+            return False
+
+        client.buf += chunk
+        while b"\n" in client.buf:
+            line, _, rest = bytes(client.buf).partition(b"\n")
+            client.buf = bytearray(rest)
+            self._on_request(client, line.decode(errors="replace").strip())
+        if len(client.buf) > 4096:
+            client.read_watch = None
+            self._drop(client)  # Not a hub client
+            return False
+        return True
+
+    def _on_request(self, client, request):
+        if request == "subscribe":
+            client.subscribed = True
+            self._queue(client, self._snapshot_message())
+        elif request == "snapshot" and client.subscribed:
+            self._queue(client, self._snapshot_message())
+        elif request == "get_tree":
+            tree = tree_dict(self._root) if self._root is not None else None
+            client.close_when_flushed = True
+            self._queue(client, _encode(tree))
+        else:
+            client.close_when_flushed = True
+            self._queue(client, _encode({"error": f"unknown request {request!r}"}))
+
+    def _drop(self, client):
+        from gi.repository import GLib
+
+        for watch in (client.read_watch, client.write_watch):
+            if watch is not None:
+                GLib.source_remove(watch)
+        client.read_watch = client.write_watch = None
+        client.sock.close()
+        self.clients.discard(client)
+        metrics.gauge("hub_clients", len(self.clients))
+
+    def stats(self):
+        return {
+            "clients": len(self.clients),
+            "subscribers": sum(1 for c in self.clients if c.subscribed),
+            "patches_sent": self.patches_sent,
+            "snapshots_sent": self.snapshots_sent,
+            "clients_dropped": self.clients_dropped,
+            "queued_bytes": sum(c.pending for c in self.clients),
+        }
+
+    def stop(self):
+        if self._stall_check_id is not None:
+            from gi.repository import GLib
+            GLib.source_remove(self._stall_check_id)
+            self._stall_check_id = None
+        for client in list(self.clients):
+            self._drop(client)
+        self.server.stop()
+
+
+# ----- Client -----
+
+class HubConnection:
+    """Backend (see backends.py) that gets trees from a hub.
+
+    Commands are not tree traffic and go straight to sway.
+    """
+
+    def __init__(self, path=None):
+        self.socket_path = path or socket_path()
+        if not daemon.is_running(self.socket_path):
+            raise OSError(f"No hub is running at {self.socket_path} (start one with --hub)")
+        self._commands = None
+
+    def command(self, cmd):
+        if self._commands is None:
+            import backends
+            self._commands = backends.RawConnection()
+        return self._commands.command(cmd)
+
+    def get_tree_data(self, timeout=5.0):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(self.socket_path)
+            sock.sendall(b"get_tree\n")
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        data = json.loads(b"".join(chunks))
+        if data is None or "error" in data:
+            raise ConnectionError("The hub has no tree yet")
+        return data
+
+    def subscribe(self, model, handler):
+        return HubSubscription(self.socket_path, model, handler)
+
+
+class HubSubscription:
+    """Non-blocking reader that mirrors a hub's tree into a TreeModel.
+
+    Same contract as backends.EventSocket: ``open()`` returns a descriptor
+    to watch, ``read()`` drains it. After each applied message,
+    ``handler(changes)`` is called with the list of (kind, con id) pairs
+    (None after a snapshot).
+    """
+
+    def __init__(self, path, model, handler):
+        self.path = path
+        self.model = model
+        self.handler = handler
+        self.sock = None
+        self.seq = None  # Last applied message; None until the first snapshot
+        self._buf = bytearray()
+
+    def open(self):
+        """Connect (or reconnect); the hub starts with a fresh snapshot."""
+        self.close()
+        self.seq = None
+        self._buf = bytearray()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+        self.sock.sendall(b"subscribe\n")
+        self.sock.setblocking(False)
+        return self.sock.fileno()
+
+    def read(self):
+        """Drain the socket. Returns False once the hub closed the connection."""
+        closed = False
+        while True:
+            try:
+                chunk = self.sock.recv(65536)
+            except BlockingIOError:
+                break
+            if not chunk:
+                closed = True
+                break
+            self._buf += chunk
+
+        end = self._buf.rfind(b"\n")
+        if end >= 0:
+            lines = bytes(self._buf[:end]).split(b"\n")
+            del self._buf[:end + 1]
+            for line in lines:
+                self._apply(json.loads(line))
+        return not closed
+
+    def _apply(self, message):
+        kind = message.get("type")
+        if kind == "patch":
+            if message["base"] != self.seq:
+                if self.seq is not None:
+                    self.request_snapshot()  # Missed something
+                return  # Otherwise a snapshot is already on its way
+        elif kind != "snapshot":
+            return
+
+        if message["root"] is None:
+            self.seq = message["seq"]  # The hub has no tree yet
+            return
+
+        built = {}
+
+        def child(con_id):
+            node = built.get(con_id)
+            if node is None and kind == "patch":
+                node = self.model.get(con_id)  # Unchanged since the last message
+            if node is None:
+                raise KeyError(con_id)
+            return node
+
+        try:
+            # Records come parents first; build children first
+            for record in reversed(message["nodes"]):
+                built[record["id"]] = node_from_record(record, child)
+            root = child(message["root"])
+        except KeyError:
+            return self.request_snapshot()
+
+        self.seq = message["seq"]
+        self.model.replace_root(root)
+        self.handler([tuple(c) for c in message["changes"]] if kind == "patch" else None)
+
+    def request_snapshot(self):
+        """Ask the hub to resend the whole tree."""
+        self.seq = None
+        try:
+            self.sock.sendall(b"snapshot\n")
+        except OSError:
+            pass
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
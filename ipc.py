@@ -1,50 +1,374 @@
-import threading
+import time
 
-import i3ipc
+from gi.repository import GLib
 
+import backends
+from diff import diff_trees
+from metrics import metrics
+from tree import TreeModel
 
-class SwayListener(threading.Thread):
-    def __init__(self, callback):
-        super().__init__()
+# Events that can change what the viewer draws
+EVENTS = ("window", "workspace", "binding")
+
+# Seconds between attempts to reach a hub that went away
+HUB_RECONNECT_INTERVAL = 2
+
+
+class RefreshScheduler:
+    """Coalesces bursts of refresh requests into a single fetch.
+
+    A request starts a debounce window; further requests inside the window
+    extend it, but never past ``max_latency`` seconds after the first
+    unserved request. Runs on GLib timeouts in the main loop: at most one
+    timeout is pending, and nothing runs while idle.
+    """
+
+    def __init__(self, fetch, debounce=0.03, max_latency=0.15):
+        self.fetch = fetch
+        self.debounce = debounce
+        self.max_latency = max(max_latency, debounce)
+
+        # Counters (events received vs. fetches actually issued)
+        self.events_received = 0
+        self.fetches_issued = 0
+
+        self._first_pending = None  # Time of the oldest unserved request
+        self._last_request = None   # Time of the newest request
+        self._source = None         # Pending GLib timeout
+
+    def request(self):
+        """Ask for a refresh. Cheap; later requests just move the deadline."""
+        now = time.monotonic()
+        self.events_received += 1
+        if self._first_pending is None:
+            self._first_pending = now
+        self._last_request = now
+        if self._source is None:
+            self._arm()
+
+    def _deadline(self):
+        return min(self._last_request + self.debounce,
+                   self._first_pending + self.max_latency)
+
+    def _arm(self):
+        delay = max(0.0, self._deadline() - time.monotonic())
+        self._source = GLib.timeout_add(int(delay * 1000), self._on_timeout)
+
+    def _on_timeout(self):
+        self._source = None
+        if self._first_pending is None:
+            return False
+
+        # The window was extended by newer requests; wait for the rest of it
+        if self._deadline() - time.monotonic() > 0.001:
+            self._arm()
+            return False
+
+        self._fire()
+        return False
+
+    def _fire(self):
+        self._first_pending = None
+        self._last_request = None
+        self.fetches_issued += 1
+        self.fetch()
+
+    def flush(self):
+        """Serve pending requests now instead of when the window closes."""
+        self.stop()
+        if self._first_pending is not None:
+            self._fire()
+
+    def stats(self):
+        return {
+            "events_received": self.events_received,
+            "fetches_issued": self.fetches_issued,
+        }
+
+    def stop(self):
+        if self._source is not None:
+            GLib.source_remove(self._source)
+            self._source = None
+
+
+class SwayListener:
+    """Keeps a TreeModel in sync with sway from inside the GLib main loop.
+
+    The subscription socket is attached as a GLib IO watch, so events are
+    handled on the main thread with no extra thread or lock. The scheduler
+    keeps at most one update pending, and it always publishes the latest
+    model state.
+
+    Every publish is diffed against the previous one (see diff.py). Refreshes
+    that change nothing are dropped; otherwise the TreeDiff is passed to
+    ``callback(workspace, path, diff)`` and to any ``add_diff_listener``
+    callbacks, which see every change, not just those in the drawn view.
+
+    With a hub connection (``--backend hub``) the listener subscribes to the
+    hub instead of sway and only publishes the trees it is sent.
+    """
+
+    def __init__(self, callback, debounce=0.03, max_latency=0.15, check_interval=30.0,
+                 connection=None, backend="i3ipc", model=None):
         self.callback = callback
-        self.connection = None
-        self.stop_event = threading.Event()
-        self.daemon = True
+        self.connection = connection  # May be shared with the caller
+        self.backend = backend
+        self.events = None
+        self.scheduler = RefreshScheduler(self._scheduled_refresh,
+                                          debounce=debounce, max_latency=max_latency)
+
+        # Local mirror of the layout tree, updated from event payloads.
+        # The caller may hand us a model it already primed with a tree.
+        self.model = model if model is not None else TreeModel()
+        self.check_interval = check_interval
+        self._needs_resync = False
+        self._published = None  # Key of the view last handed to the GUI
+        self.overview = False   # Publish changes anywhere in the tree, not just the focused workspace
+        self._diff_root = None  # Root of the snapshot the last diff ended at
+        self._diff_listeners = []
+        self._watch_id = None
+        self._check_id = None
+        self._reconnect_id = None
+        self.recorder = None    # recording.Recorder, set for --record
 
-    def run(self):
+        # Counters
+        self.tree_fetches = 0
+        self.deltas_applied = 0
+        self.consistency_failures = 0
+
+    def start(self):
         # Start Event Listener
         try:
-            self.connection = i3ipc.Connection()
-            self.connection.on("window", self.on_event)
-            self.connection.on("workspace", self.on_event)
-            self.connection.on("binding", self.on_event)
-            # self.connection.on('mode', self.on_event) # Potential extra event
+            if self.connection is None:
+                self.connection = backends.connect(self.backend)
+            if self._uses_hub():
+                # Hub backend: the hub applies sway's events and sends us
+                # ready-made trees, so there is nothing to resync or verify
+                self.events = self.connection.subscribe(self.model, self._on_hub_update)
+                self.check_interval = 0
+            else:
+                self.events = backends.EventSocket(self.connection.socket_path, EVENTS,
+                                                   self._on_event)
+            self._watch(self.events.open())
+        except Exception as e:
+            print(f"Event listener failed: {e}")
+            return
 
-            # Initial fetch
+        # Initial fetch (not debounced, so the first frame appears immediately),
+        # unless the caller already primed the model with a tree it fetched
+        if self.model.root is None:
             self.refresh_tree(self.connection)
+        else:
+            self._remember_published(*self.model.focused_view())
 
-            self.connection.main()
-        except Exception as e:
+        if self.check_interval:
+            self._check_id = GLib.timeout_add_seconds(int(self.check_interval),
+                                                      self._on_check)
+
+    def _on_readable(self, fd, condition):
+        try:
+            alive = self.events.read()
+        except OSError as e:
+            # The socket itself failed (ConnectionError included)
             print(f"Event listener failed: {e}")
+            alive = False
+        except ValueError as e:
+            # An event that could not be decoded; the stream is still fine
+            print(f"Ignoring malformed IPC event: {e}")
+            self._request_resync()
+            alive = True
+        # Only the end of the stream stops the watch
+        if condition & (GLib.IO_HUP | GLib.IO_ERR):
+            alive = False
+        if not alive:
+            self._watch_id = None
+            if self._uses_hub():
+                # The hub may just be restarting; a new subscription starts
+                # with a full snapshot, so nothing is lost in between
+                print("Lost the hub; reconnecting")
+                self._reconnect_id = GLib.timeout_add_seconds(HUB_RECONNECT_INTERVAL,
+                                                              self._on_reconnect)
+        return alive
+
+    def _watch(self, fd):
+        self._watch_id = GLib.io_add_watch(fd, GLib.PRIORITY_DEFAULT,
+                                           GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR,
+                                           self._on_readable)
 
-    def on_event(self, i3, event):
-        self.refresh_tree(self.connection)
+    def _uses_hub(self):
+        return hasattr(self.connection, "subscribe")
+
+    def _on_reconnect(self):
+        try:
+            self._watch(self.events.open())
+        except OSError:
+            return True  # Try again later
+        print("Reconnected to the hub")
+        self._reconnect_id = None
+        return False
+
+    def _on_event(self, name, data):
+        # A payload the model cannot apply must not take the watch down
+        try:
+            self.on_ipc_event(name, data)
+        except Exception as e:
+            print(f"Failed to apply {name} event, resyncing: {e!r}")
+            self._request_resync()
+
+    def _request_resync(self):
+        if self._uses_hub():
+            self.events.request_snapshot()
+            return
+        self._needs_resync = True
+        self.scheduler.request()
+
+    def on_ipc_event(self, name, data):
+        metrics.count("events")
+        if self.recorder:
+            self.recorder.event(name, data)
+        if name == "window":
+            applied = self.model.apply_window_event(data["change"], data["container"])
+        elif name == "workspace":
+            applied = self.model.apply_workspace_event(data["change"], data.get("current"),
+                                                       data.get("old"))
+        else:
+            # Bindings can change the layout without emitting window events
+            # (e.g. "layout tabbed"), so they always need a full resync.
+            applied = False
+
+        if applied:
+            self.deltas_applied += 1
+        else:
+            self._needs_resync = True
+        # Bursts of events (workspace switches, for_window rules) are merged
+        # into a single publish/resync by the scheduler.
+        self.scheduler.request()
+
+    def _on_hub_update(self, changes):
+        # The hub already coalesced the burst; publish right away
+        metrics.count("events")
+        self.deltas_applied += 1
+        try:
+            self._publish()
+        except Exception as e:
+            print(f"Failed to publish a hub update: {e!r}")
+
+    def flush(self):
+        """Publish pending changes now, without waiting for the debounce.
+
+        For callers that drive the listener without a main loop, such as the
+        benchmarks.
+        """
+        self.scheduler.flush()
+
+    def _scheduled_refresh(self):
+        if self._needs_resync:
+            self.refresh_tree(self.connection)
+        else:
+            self._publish()
 
     def refresh_tree(self, conn):
+        """Full resync: fetch the whole tree and rebuild the mirror."""
         if not conn:
             return
         try:
-            tree = conn.get_tree()
-            workspaces = conn.get_workspaces()
-            focused_ws = next((ws for ws in workspaces if ws.focused), None)
-
-            if focused_ws:
-                self.callback(tree, focused_ws.name)
+            self._needs_resync = False
+            start = time.perf_counter()
+            tree_data = conn.get_tree_data()
+            metrics.record("ipc_fetch", time.perf_counter() - start)
+            self.tree_fetches += 1
+            if self.recorder:
+                self.recorder.tree(tree_data)
+            self.model.reset(tree_data)
+            self._publish()
         except Exception as e:
-            # Connection might be closed or broken
-            pass
+            # Connection might be closed or broken, or a listener failed
+            print(f"Tree refresh failed: {e!r}")
+
+    def _view_key(self, workspace, path):
+        # Snapshots are copy-on-write, so an unchanged subtree keeps its
+        # identity: outside overview mode, changes on other workspaces and
+        # outputs cost no redraw.
+        if self.overview:
+            return (self.model.root,)
+        return (workspace, tuple(n.name or n.type for n in path))
+
+    def _remember_published(self, workspace, path):
+        if workspace is not None:
+            self._published = self._view_key(workspace, path)
+            self._diff_root = self.model.root
+
+    def add_diff_listener(self, fn):
+        """Call ``fn(diff)`` with the TreeDiff of every published change."""
+        self._diff_listeners.append(fn)
+
+    def set_overview(self, enabled):
+        """Switch between publishing the focused workspace or the whole tree."""
+        self.overview = enabled
+        self._published = None
+        self._publish(force=True)
+
+    def _publish(self, force=False):
+        workspace, path = self.model.focused_view()
+        if workspace is None:
+            return
+
+        metrics.gauge("nodes", len(self.model))
+        # The first diff (from no tree) lists every node as added
+        diff = diff_trees(self._diff_root, self.model.root)
+        if not diff and not force:
+            return  # e.g. a binding event whose resync changed nothing
+        self._diff_root = self.model.root
+        if diff:
+            for fn in self._diff_listeners:
+                fn(diff)
+
+        key = self._view_key(workspace, path)
+        if key == self._published:
+            return
+        self._published = key
+        self.callback(workspace, path, diff)
+
+    def _on_check(self):
+        # Some changes (e.g. resizes issued by other IPC clients) emit no
+        # events at all; periodically verify the mirror against sway.
+        self.verify()
+        return True
+
+    def verify(self):
+        """Compare the mirror against a fresh get_tree() and resync on drift."""
+        try:
+            start = time.perf_counter()
+            tree_data = self.connection.get_tree_data()
+            metrics.record("ipc_fetch", time.perf_counter() - start)
+            self.tree_fetches += 1
+        except Exception:
+            return
+        if self.recorder:
+            self.recorder.tree(tree_data)
+        if self.model.is_consistent_with(tree_data):
+            return
+        self.consistency_failures += 1
+        self.model.reset(tree_data)
+        self._publish()
+
+    def stats(self):
+        """Return event/fetch counters for tuning the debounce window."""
+        stats = self.scheduler.stats()
+        stats.update({
+            "tree_fetches": self.tree_fetches,
+            "deltas_applied": self.deltas_applied,
+            "consistency_failures": self.consistency_failures,
+        })
+        return stats
 
     def stop(self):
-        self.stop_event.set()
-        if self.connection:
-            self.connection.main_quit()
+        self.scheduler.stop()
+        for source in (self._watch_id, self._check_id, self._reconnect_id):
+            if source is not None:
+                GLib.source_remove(source)
+        self._watch_id = None
+        self._check_id = None
+        self._reconnect_id = None
+        if self.events:
+            self.events.close()
@@ -0,0 +1,126 @@
+from collections import OrderedDict
+
+import cairo
+
+ELLIPSIS = "…"
+
+
+class Label:
+    """A measured, pre-shaped text run positioned at the origin."""
+
+    __slots__ = ("font", "glyphs", "width", "height")
+
+    def __init__(self, font, glyphs, width, height):
+        self.font = font      # cairo.ScaledFont the glyphs belong to
+        self.glyphs = glyphs  # [cairo.Glyph], baseline at y = 0
+        self.width = width
+        self.height = height
+
+
+class LabelCache:
+    """Caches measured extents and glyph runs keyed by (text, size, weight).
+
+    Window titles change constantly, so entries are kept in a bounded LRU.
+    Ellipsized variants are cached separately per (pixel) width, so a title
+    that does not change is never re-measured on later frames.
+    """
+
+    def __init__(self, family="Sans", max_entries=4096):
+        self.family = family
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._fonts = {}
+        self._entries = OrderedDict()
+
+    def set_family(self, family):
+        """Switch font family (e.g. on theme reload); drops every cached run."""
+        if family != self.family:
+            self.family = family
+            self._fonts.clear()
+            self._entries.clear()
+
+    def _font(self, size, weight):
+        key = (size, weight)
+        font = self._fonts.get(key)
+        if font is None:
+            face = cairo.ToyFontFace(self.family, cairo.FONT_SLANT_NORMAL, weight)
+            font = cairo.ScaledFont(face, cairo.Matrix(xx=size, yy=size),
+                                    cairo.Matrix(), cairo.FontOptions())
+            self._fonts[key] = font
+        return font
+
+    def _lookup(self, key):
+        label = self._entries.get(key)
+        if label is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return label
+
+    def _store(self, key, label):
+        self._entries[key] = label
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return label
+
+    def get(self, text, size, weight=cairo.FONT_WEIGHT_BOLD):
+        """Return the full, unclipped label."""
+        size = round(size * 2) / 2  # Collapsed headers vary by sub-pixel amounts
+        key = (text, size, weight)
+        label = self._lookup(key)
+        if label is not None:
+            return label
+
+        font = self._font(size, weight)
+        glyphs, _, _ = font.text_to_glyphs(0, 0, text, True)
+        extents = font.text_extents(text)
+        return self._store(key, Label(font, glyphs, extents.x_advance, extents.height))
+
+    def fit(self, text, size, max_width, weight=cairo.FONT_WEIGHT_BOLD):
+        """Return the label, ellipsized to at most ``max_width`` pixels."""
+        full = self.get(text, size, weight)
+        if full.width <= max_width:
+            return full
+
+        size = round(size * 2) / 2
+        key = (text, size, weight, int(max_width))
+        label = self._lookup(key)
+        if label is not None:
+            return label
+
+        # Keep as many leading glyphs as fit next to the ellipsis, reusing the
+        # glyph positions measured for the full label.
+        ellipsis = self.get(ELLIPSIS, size, weight)
+        room = max_width - ellipsis.width
+        keep = 0
+        while keep < len(full.glyphs) and full.glyphs[keep].x <= room:
+            keep += 1
+        keep = max(keep - 1, 0)
+        offset = full.glyphs[keep].x if keep < len(full.glyphs) else full.width
+
+        glyphs = list(full.glyphs[:keep])
+        glyphs += [cairo.Glyph(g.index, g.x + offset, g.y) for g in ellipsis.glyphs]
+        return self._store(key, Label(full.font, glyphs, offset + ellipsis.width, full.height))
+
+    def show(self, ctx, label, x, y):
+        """Draw a label with its baseline origin at (x, y)."""
+        ctx.save()
+        ctx.translate(x, y)
+        ctx.set_scaled_font(label.font)
+        ctx.show_glyphs(label.glyphs)
+        ctx.restore()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Shared by every renderer in the process
+label_cache = LabelCache()
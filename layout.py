@@ -0,0 +1,408 @@
+import math
+import time
+
+from metrics import metrics
+from theme import theme as default_theme
+
+# Overview (all workspaces) level-of-detail defaults
+OVERVIEW_MIN_BOX = 14    # Subtrees smaller than this (px) collapse to one box
+OVERVIEW_MIN_LABEL = 40  # Boxes narrower than this (px) get no label
+OVERVIEW_GAP = 8         # Space between workspace cells
+
+# Paint operations emitted by the layout pass
+OP_FILL = 0    # Background + header label of a box
+OP_BORDER = 1  # Border of a box (emitted after its children)
+OP_TAB = 2     # Highlight marker for the active tab
+
+
+class Box:
+    """A positioned container, ready to be painted."""
+
+    __slots__ = ("node_id", "x", "y", "w", "h", "label", "header_h",
+                 "focused", "is_leaf", "style")
+
+    def __init__(self, node_id, x, y, w, h, label="", header_h=0,
+                 focused=False, is_leaf=False, style=0):
+        self.node_id = node_id
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        self.label = label
+        self.header_h = header_h  # 0 if the header is too small to draw
+        self.focused = focused
+        self.is_leaf = is_leaf
+        self.style = style  # Index into theme.StyleTable.boxes
+
+    def key(self):
+        """Everything that affects how the box looks."""
+        return (self.x, self.y, self.w, self.h, self.label, self.header_h,
+                self.focused, self.is_leaf, self.style)
+
+    def extents(self, margin=2):
+        """Integer pixel rectangle covering the box and its border."""
+        x0 = int(self.x) - margin
+        y0 = int(self.y) - margin
+        return (x0, y0, int(self.w + self.x) + margin + 1 - x0,
+                int(self.h + self.y) + margin + 1 - y0)
+
+
+class Layout:
+    """Flat, paint-ordered list of operations for one subtree."""
+
+    def __init__(self, ops):
+        self.ops = ops  # [(OP_*, Box)]
+        self.boxes = {box.node_id: box for op, box in ops if op == OP_FILL}
+
+    def changed_extents(self, other):
+        """Pixel rectangles that differ between two layouts.
+
+        Returns None when the layouts differ so much that a full redraw is
+        cheaper than many small ones.
+        """
+        if other is None:
+            return None
+        rects = []
+        for node_id, box in self.boxes.items():
+            old = other.boxes.get(node_id)
+            if old is None:
+                rects.append(box.extents())
+            elif old.key() != box.key():
+                rects.append(old.extents())
+                rects.append(box.extents())
+        for node_id, old in other.boxes.items():
+            if node_id not in self.boxes:
+                rects.append(old.extents())
+        if len(rects) > 32:
+            return None
+        return rects
+
+    def extents_for(self, ids, other):
+        """Pixel rectangles of the given con ids in this and another layout.
+
+        Cheaper than ``changed_extents`` when the changed ids are already
+        known (from a diff.TreeDiff). Returns None above the same limit.
+        """
+        rects = []
+        for con_id in ids:
+            for layout in (self, other):
+                box = layout.boxes.get(con_id)
+                if box is not None:
+                    rects.append(box.extents())
+        if len(rects) > 32:
+            return None
+        return rects
+
+
+def interpolate(old, new, t):
+    """Layout between two layouts of the same tree, for animated transitions.
+
+    Boxes present in both are moved/resized ``t`` (0..1) of the way from
+    ``old`` to ``new``; everything else (labels, focus, new boxes) is taken
+    from ``new`` as is.
+    """
+    if t >= 1:
+        return new
+    tabs = {box.node_id: box for op, box in old.ops if op == OP_TAB}
+    moved = {}  # id(new box) -> interpolated box; FILL and BORDER share a Box
+    ops = []
+    for op, box in new.ops:
+        frame = moved.get(id(box))
+        if frame is None:
+            prev = tabs.get(box.node_id) if op == OP_TAB else old.boxes.get(box.node_id)
+            if prev is None:
+                frame = box
+            else:
+                frame = Box(box.node_id,
+                            prev.x + (box.x - prev.x) * t, prev.y + (box.y - prev.y) * t,
+                            prev.w + (box.w - prev.w) * t, prev.h + (box.h - prev.h) * t,
+                            label=box.label, header_h=box.header_h,
+                            focused=box.focused, is_leaf=box.is_leaf, style=box.style)
+            moved[id(box)] = frame
+        ops.append((op, frame))
+    return Layout(ops)
+
+
+def workspace_frame(ws_rect, w_width, w_height, header=True):
+    """Return the rectangle a workspace is drawn into (aspect corrected).
+
+    ``header`` reserves room at the top for the breadcrumb line.
+    """
+    avail_y = 30 if header else 5 # Room for breadcrumbs
+
+    # Available area for the tree
+    avail_h = w_height - avail_y - 10
+    avail_w = w_width - 20
+
+    # Aspect Ratio Correction
+    # Get actual workspace geometry
+    if ws_rect.width and ws_rect.height and avail_w > 0 and avail_h > 0:
+        ws_ratio = ws_rect.width / ws_rect.height
+        win_ratio = avail_w / avail_h
+
+        final_w = avail_w
+        final_h = avail_h
+
+        if ws_ratio > win_ratio:
+            # Workspace is wider than window: constrain by width
+            final_h = avail_w / ws_ratio
+        else:
+            # Workspace is taller than window: constrain by height
+            final_w = avail_h * ws_ratio
+
+        # Center it
+        offset_x = 10 + (avail_w - final_w) / 2
+        offset_y = avail_y + (avail_h - final_h) / 2
+        return offset_x, offset_y, final_w, final_h
+
+    # Fallback if no geometry info
+    return 10, avail_y, avail_w, avail_h
+
+
+def overview_frame(w_width, w_height, header=True):
+    """Return the rectangle the overview grid is drawn into."""
+    avail_y = 30 if header else 5
+    return 10, avail_y, w_width - 20, w_height - avail_y - 10
+
+
+def node_label(node, is_leaf):
+    if node.type == 'workspace':
+        return f"WS: {node.name}"
+    elif node.type == 'con':
+        if is_leaf:
+            return node.name if node.name else "unnamed"
+        return f"{node.layout}"
+    elif node.type == 'floating_con':
+        return "Float"
+    return ""
+
+
+class LayoutEngine:
+    """Turns a workspace subtree into positioned boxes.
+
+    Results are cached by (tree version, allocation size, flags, theme
+    generation), so resize and expose events on an unchanged tree only
+    replay the cached list. Padding and header sizes come from the theme.
+    """
+
+    def __init__(self, include_floating=False, theme=None):
+        self.include_floating = include_floating
+        self.theme = theme or default_theme
+        self._cache_key = None
+        self._cache = None
+
+        # Level of detail (0 disables a rule)
+        self.min_box = 0    # Collapse subtrees smaller than this to a single box
+        self.min_label = 0  # Skip labels on boxes narrower than this
+        self.viewport = None  # (x0, y0, x1, y1); boxes outside are not traversed
+
+    def layout(self, version, node, x, y, w, h, overview=False):
+        key = (version, x, y, w, h, self.include_floating, overview, self.theme.generation)
+        if key != self._cache_key:
+            start = time.perf_counter()
+            if overview:
+                self._cache = self.layout_overview(node, x, y, w, h)
+            else:
+                self._cache = self.layout_node(node, x, y, w, h)
+            self._cache_key = key
+            metrics.record("layout", time.perf_counter() - start)
+        return self._cache
+
+    def layout_node(self, node, x, y, w, h):
+        """Uncached layout of a single subtree."""
+        ops = []
+        self._layout(ops, node, x, y, w, h)
+        return Layout(ops)
+
+    def layout_overview(self, root, x, y, w, h):
+        """Tile every output (as a band) and its workspaces (as a grid).
+
+        Uses the overview level-of-detail rules, so a session with dozens of
+        workspaces and hundreds of windows stays cheap to lay out and paint.
+        """
+        saved = (self.min_box, self.min_label, self.viewport)
+        self.min_box = OVERVIEW_MIN_BOX
+        self.min_label = OVERVIEW_MIN_LABEL
+        self.viewport = (x, y, x + w, y + h)
+        try:
+            ops = []
+            outputs = [o for o in root.nodes
+                       if o.type == 'output' and not (o.name or "").startswith("__")]
+            if outputs:
+                band_h = h / len(outputs)
+                for i, output in enumerate(outputs):
+                    self._layout_output(ops, output, x, y + i * band_h, w, band_h)
+            return Layout(ops)
+        finally:
+            self.min_box, self.min_label, self.viewport = saved
+
+    def _layout_output(self, ops, output, x, y, w, h):
+        if w <= 0 or h <= 0: return
+        header_h = self.theme.header_h
+        box = Box(output.id, x, y, w, h, label=output.name or "output", header_h=header_h,
+                  style=self.theme.style_key(output, False))
+        ops.append((OP_FILL, box))
+
+        workspaces = [ws for ws in output.nodes if ws.type == 'workspace']
+        gx = x + OVERVIEW_GAP
+        gy = y + header_h + OVERVIEW_GAP
+        gw = w - 2 * OVERVIEW_GAP
+        gh = h - header_h - 2 * OVERVIEW_GAP
+        if workspaces and gw > 0 and gh > 0:
+            # Pick the column count that makes cells closest to the output's shape
+            ws_ratio = (output.rect.width / output.rect.height) if output.rect.height else 16 / 9
+            count = len(workspaces)
+            cols = max(1, min(count, round(math.sqrt(count * gw / (gh * ws_ratio)))))
+            rows = math.ceil(count / cols)
+            cell_w = gw / cols
+            cell_h = gh / rows
+
+            for i, ws in enumerate(workspaces):
+                cx = gx + (i % cols) * cell_w
+                cy = gy + (i // cols) * cell_h
+                fw = cell_w - OVERVIEW_GAP
+                fh = cell_h - OVERVIEW_GAP
+                # Aspect-fit the workspace in its cell
+                if fw / max(fh, 1) > ws_ratio:
+                    fw = fh * ws_ratio
+                else:
+                    fh = fw / ws_ratio
+                self._layout(ops, ws, cx, cy, fw, fh)
+
+        ops.append((OP_BORDER, box))
+
+    def _layout(self, ops, node, x, y, w, h):
+        if w <= 0 or h <= 0: return
+
+        # Off-screen subtrees are not traversed at all
+        if self.viewport is not None:
+            x0, y0, x1, y1 = self.viewport
+            if x > x1 or y > y1 or x + w < x0 or y + h < y0:
+                return
+
+        # Subtrees below the size threshold collapse to a single box
+        collapsed = w < self.min_box or h < self.min_box
+
+        is_leaf = len(node.nodes) == 0
+        theme = self.theme
+        pad = theme.pad
+        full_header_h = theme.header_h
+
+        # Use a dynamic header height based on size, but clamped.
+        # If the node is very small (likely a tab or collapsed stack item),
+        # force the header to fill the space so text is visible.
+        if h < full_header_h * 1.5:
+            header_h = h - 2 # Use almost full height
+        else:
+            header_h = min(full_header_h, h * 0.3)
+
+        # If header was too small, don't reserve space for it
+        effective_header_h = header_h if header_h > 8 else 0
+
+        show_label = effective_header_h and w >= self.min_label
+        box = Box(node.id, x, y, w, h,
+                  label=node_label(node, is_leaf) if show_label else "",
+                  header_h=effective_header_h if show_label else 0,
+                  focused=node.focused, is_leaf=is_leaf,
+                  style=theme.style_key(node, is_leaf))
+        ops.append((OP_FILL, box))
+
+        # Calculate Content Area for Children
+
+        # If this is a "Collapsed" view (header takes up most space), don't draw content
+        if h < full_header_h * 1.5:
+            effective_header_h = h # Consume all space
+
+        cx = x + pad
+        cy = y + effective_header_h
+        cw = w - (2 * pad)
+        ch = h - effective_header_h - pad
+
+        if cw > 0 and ch > 0 and not collapsed:
+            if not is_leaf:
+                self._layout_children(ops, node, cx, cy, cw, ch)
+
+            if self.include_floating:
+                for child in node.floating_nodes:
+                    fw = w * 0.5
+                    fh = h * 0.5
+                    fx = x + (w - fw) / 2
+                    fy = y + (h - fh) / 2
+                    self._layout(ops, child, fx, fy, fw, fh)
+
+        # Border last, so focus stays visible on top of the children
+        ops.append((OP_BORDER, box))
+
+    def _layout_children(self, ops, node, cx, cy, cw, ch):
+        children = node.nodes
+        count = len(children)
+        tab_size = self.theme.tab_size
+
+        if node.layout in ['splith', 'splitv']:
+            # Calculate total size in Sway units to determine ratios
+            # Note: node.rect might not exactly match sum of children due to borders/gaps in sway
+            # So we sum children.
+            if node.layout == 'splith':
+                total_sway_size = sum(c.rect.width for c in children)
+            else:
+                total_sway_size = sum(c.rect.height for c in children)
+
+            if total_sway_size == 0: total_sway_size = 1 # avoid div/0
+
+            curr_pos = 0
+            for child in children:
+                if node.layout == 'splith':
+                    child_w = cw * (child.rect.width / total_sway_size)
+                    self._layout(ops, child, cx + curr_pos, cy, child_w, ch)
+                    curr_pos += child_w
+                else: # splitv
+                    child_h = ch * (child.rect.height / total_sway_size)
+                    self._layout(ops, child, cx, cy + curr_pos, cw, child_h)
+                    curr_pos += child_h
+
+        elif node.layout in ['tabbed', 'stacked']:
+            # Identify Active Child
+            active_child = children[0]
+            if node.focus:
+                active_id = node.focus[0]
+                active_child = next((c for c in children if c.id == active_id), children[0])
+
+            if node.layout == 'tabbed':
+                # TABBED: Top Horizontal Strip for Headers + Main Area for Active Content
+                tab_w = cw / count
+                for i, child in enumerate(children):
+                    tx = cx + (i * tab_w)
+                    if child is active_child:
+                        # Highlight Active Tab (its body is drawn below)
+                        ops.append((OP_TAB, Box(child.id, tx, cy, tab_w, tab_size)))
+                    else:
+                        # Inactive Tab (renders frame/header only)
+                        self._layout(ops, child, tx, cy, tab_w, tab_size)
+
+                # Active Body
+                body_h = ch - tab_size
+                if body_h > 0:
+                    self._layout(ops, active_child, cx, cy + tab_size, cw, body_h)
+
+            else:
+                # STACKED: Accordion (Vertical List)
+                # Inactive get Header height. Active gets remaining.
+                inactive_count = count - 1
+                req_header_space = inactive_count * tab_size
+
+                # Header height for inactive nodes
+                h_h = tab_size
+                if req_header_space > ch * 0.6: # If headers take > 60% of space, compress
+                    h_h = (ch * 0.6) / inactive_count if inactive_count > 0 else tab_size
+
+                curr_y = cy
+                for child in children:
+                    if child is active_child:
+                        # Active gets remaining space
+                        rem_h = ch - (inactive_count * h_h)
+                        self._layout(ops, child, cx, curr_y, cw, rem_h)
+                        curr_y += rem_h
+                    else:
+                        # Inactive gets header space
+                        self._layout(ops, child, cx, curr_y, cw, h_h)
+                        curr_y += h_h
@@ -2,46 +2,43 @@ import argparse
 import sys
 import os
 import signal
-import gi
-import i3ipc
-gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, GLib
+import time
 
-from gui import TreeVisualizer
-from ipc import SwayListener
+# Only the standard library is imported up front: toggling a running
+# daemon or closing an existing window must not pay for GTK or i3ipc.
+import daemon
 
-def main():
-    """Main entry point for the Sway Tree Visualizer application."""
-    
-    # 0. CONNECT TO IPC EARLY (Before GUI creation)
-    # capture the ID of the currently focused window immediately
-    previous_focus_id = None
-    try:
-        ipc = i3ipc.Connection()
-        tree = ipc.get_tree()
-        focused_node = tree.find_focused()
-        if focused_node:
-            previous_focus_id = focused_node.id
-        
-        # 1. TOGGLE CHECK
-        # Search for an existing instance of our application
-        # We search by title since we set it in gui.py
-        existing = tree.find_named("SwayTreeViewer")
-        
-        if existing:
-            # If we find one, we assume the user wants to close it (Toggle behavior)
-            for node in existing:
-                node.command('kill')
-            sys.exit(0)
 
-        # PREVENT FOCUS STEALING
-        # Tell Sway explicitly NOT to focus this specific process's window when it appears.
-        # This is more reliable than restoring focus afterwards.
-        ipc.command(f'for_window [pid={os.getpid()}] no_focus')
-            
-    except Exception as e:
-        print(f"IPC Initialization Warning: {e}")
+class StartupTimer:
+    """Collects a per-phase breakdown of startup latency (--timings)."""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.phases = []  # [(name, seconds)]
+        self._mark = self.start
+
+    def lap(self, name):
+        """Record the time since the previous lap under ``name``."""
+        now = time.perf_counter()
+        for i, (phase, seconds) in enumerate(self.phases):
+            if phase == name:
+                self.phases[i] = (phase, seconds + now - self._mark)
+                break
+        else:
+            self.phases.append((name, now - self._mark))
+        self._mark = now
 
+    def report(self):
+        if not self.enabled:
+            return
+        total = time.perf_counter() - self.start
+        for name, seconds in self.phases:
+            print(f"{name:<14} {seconds * 1000:8.1f} ms", file=sys.stderr)
+        print(f"{'total':<14} {total * 1000:8.1f} ms", file=sys.stderr)
+
+
+def parse_args():
     # Parse command line arguments for display mode
     parser = argparse.ArgumentParser(description="Sway Tree Visualizer")
     parser.add_argument("--mode", choices=["window", "transparent"],
@@ -54,60 +51,501 @@ def main():
                         help="Initial width of the window (pixels or %%)")
     parser.add_argument("--height", type=str, default=None,
                         help="Initial height of the window (pixels or %%)")
+    parser.add_argument("--debounce", type=float, default=30,
+                        help="Milliseconds to wait for an event burst to settle before refreshing")
+    parser.add_argument("--max-latency", type=float, default=150,
+                        help="Upper bound in milliseconds between an event and the refresh it triggers")
+    parser.add_argument("--cache-mb", type=float, default=64,
+                        help="Memory budget in MB for cached pre-rendered header labels")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Stay resident and hide instead of exiting; later invocations toggle this instance")
+    parser.add_argument("--backend", choices=["i3ipc", "raw", "hub"], default="i3ipc",
+                        help="IPC backend: i3ipc-python, a direct socket client that skips its object model, "
+                             "or a running --hub")
+    parser.add_argument("--hub", action="store_true",
+                        help="Run headless, serving one sway subscription to viewers started with --backend hub")
+    parser.add_argument("--overview", action="store_true",
+                        help="Start in overview mode (all outputs and workspaces); toggle with 'o'")
+    parser.add_argument("--timings", action="store_true",
+                        help="Print a per-phase startup latency breakdown to stderr")
+    parser.add_argument("--export", metavar="FILE", default=None,
+                        help="Render the focused workspace (or the overview) to FILE (.png, .svg, .pdf or .json) and exit")
+    parser.add_argument("--export-all", metavar="DIR", default=None,
+                        help="Render every workspace into DIR, one file each, and exit")
+    parser.add_argument("--format", choices=["png", "svg", "pdf", "json"], default=None,
+                        help="Output format for --export-all (default: png) or --export")
+    parser.add_argument("--export-size", default="1600x900",
+                        help="Size of exported snapshots as WIDTHxHEIGHT")
+    parser.add_argument("--tree", metavar="FILE", default=None,
+                        help="Export from a saved tree (swaymsg -t get_tree > FILE) instead of asking Sway")
+    parser.add_argument("--record", metavar="FILE", default=None,
+                        help="Append the session's events and tree snapshots to a compressed recording")
+    parser.add_argument("--replay", metavar="FILE", default=None,
+                        help="Play a recording back instead of connecting to Sway")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="Replay speed factor (0 = as fast as possible)")
+    parser.add_argument("--headless", action="store_true",
+                        help="With --replay: render offscreen without a window and print stage timings")
+    parser.add_argument("--profile", metavar="FILE", nargs="?", const="-", default=None,
+                        help="With --replay: run under cProfile; print the top functions or save stats to FILE")
+    parser.add_argument("--animation-ms", type=float, default=120,
+                        help="Length of move/resize transitions in milliseconds (0 disables them)")
+    parser.add_argument("--hud", action="store_true",
+                        help="Start with the performance overlay visible; toggle with 'h'")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Serve performance counters as JSON on a local socket (read them with --query-metrics)")
+    parser.add_argument("--stats-file", metavar="FILE", default=None,
+                        help="Periodically write performance counters as JSON to FILE")
+    parser.add_argument("--stats-interval", type=float, default=5,
+                        help="Seconds between --stats-file updates")
+    parser.add_argument("--query-metrics", action="store_true",
+                        help="Print the counters of a running viewer started with --metrics, then exit")
+    parser.add_argument("--theme", metavar="FILE", default=None,
+                        help="Theme file (default: $XDG_CONFIG_HOME/swaytreeviewer/theme.ini); reloaded when it changes")
     args = parser.parse_args()
 
     # Set defaults based on mode if not provided
     if args.width is None:
-        args.width = "100%" 
+        args.width = "100%"
     if args.height is None:
         args.height = "100%"
     if args.alpha is None:
         args.alpha = 0.5 if args.mode == "transparent" else 1.0
+    try:
+        width, height = args.export_size.lower().split("x")
+        args.export_size = (int(width), int(height))
+    except ValueError:
+        parser.error(f"invalid --export-size {args.export_size!r} (expected WIDTHxHEIGHT)")
+    if args.hub and args.backend == "hub":
+        parser.error("--hub needs a sway backend (i3ipc or raw)")
+    return args
+
+
+def load_theme(args):
+    """Read the theme file into the shared theme (defaults if there is none)."""
+    from theme import theme, default_path
+    try:
+        theme.load(args.theme or default_path())
+    except ValueError as e:
+        print(f"Theme ignored: {e}", file=sys.stderr)
+
+
+def start_theme_watcher(app):
+    """Reload the theme whenever its file changes; returns the watcher."""
+    from theme import theme, ThemeWatcher
+    watcher = ThemeWatcher(theme, on_reload=app.on_theme_changed)
+    try:
+        watcher.start()
+    except Exception as e:
+        print(f"Theme file not watched: {e}")
+    return watcher
+
+
+def run_hub(args):
+    """Headless hub: one sway subscription, served to many clients."""
+    from gi.repository import GLib
 
-    # For transparent mode, set up floating rule before creating window
-    # This ensures it starts floating immediately (no tiling flicker)
-    if args.mode == "transparent":
+    import hub
+    from ipc import SwayListener
+    from metrics import metrics, MetricsServer, socket_path as metrics_socket_path
+
+    listener = SwayListener(callback=lambda workspace, path, diff: None,
+                            debounce=args.debounce / 1000.0,
+                            max_latency=args.max_latency / 1000.0,
+                            backend=args.backend)
+    server = hub.HubServer(listener)
+    try:
+        server.start()
+    except OSError as e:
+        print(f"Failed to start hub: {e}", file=sys.stderr)
+        return 1
+    if args.record:
+        import recording
+        try:
+            listener.recorder = recording.Recorder(args.record)
+        except OSError as e:
+            print(f"Failed to open recording: {e}")
+    listener.start()
+    if listener.events is None:
+        server.stop()
+        return 1
+
+    metrics.add_source("listener", listener.stats)
+    metrics.add_source("hub", server.stats)
+    metrics_server = None
+    if args.metrics or args.stats_file:
+        metrics_server = MetricsServer(path=metrics_socket_path() if args.metrics else None,
+                                       stats_file=args.stats_file, interval=args.stats_interval)
         try:
-            conn = i3ipc.Connection()
-            conn.command(f'for_window [pid={os.getpid()}] floating enable')
-        except Exception as e:
-            print(f"Failed to set floating rule via IPC: {e}")
+            metrics_server.start()
+        except OSError as e:
+            print(f"Failed to start metrics socket: {e}")
+            metrics_server = None
+
+    print(f"Hub serving {server.path}")
+    loop = GLib.MainLoop()
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    try:
+        loop.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.stop()
+        if listener.recorder:
+            listener.recorder.close()
+        server.stop()
+        if metrics_server:
+            metrics_server.stop()
+    return 0
+
+
+def run_export(args):
+    """Headless export: one tree fetch, no window, no GTK."""
+    import json
+    import backends
+    from tree import TreeModel
+    from export import Exporter
+
+    load_theme(args)
+    model = TreeModel()
+    try:
+        if args.tree:
+            with open(args.tree) as f:
+                model.reset(json.load(f))
+        else:
+            model.reset(backends.connect(args.backend).get_tree_data())
+    except Exception as e:
+        print(f"Failed to load tree: {e}", file=sys.stderr)
+        return 1
+
+    width, height = args.export_size
+    exporter = Exporter(model, width=width, height=height, mode=args.mode,
+                        include_floating=args.include_floating, alpha=args.alpha)
+    try:
+        if args.export:
+            exporter.export(args.export, overview=args.overview, fmt=args.format)
+        if args.export_all:
+            for path in exporter.export_all(args.export_all, fmt=args.format or "png"):
+                print(path)
+    except (OSError, ValueError) as e:
+        print(f"Export failed: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def run_replay(args):
+    """Play a recording into the viewer (or offscreen with --headless)."""
+    import recording
+    import replay
+
+    load_theme(args)
+    try:
+        records = recording.load(args.replay)
+    except OSError as e:
+        print(f"Failed to read recording: {e}", file=sys.stderr)
+        return 1
+    if replay.first_tree(records) is None:
+        print("The recording contains no tree snapshot", file=sys.stderr)
+        return 1
+
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+
+    def report_profile():
+        if profiler is None:
+            return
+        if args.profile == "-":
+            import pstats
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(25)
+        else:
+            profiler.dump_stats(args.profile)
+
+    if args.headless:
+        width, height = args.export_size
+        if profiler:
+            profiler.enable()
+        timings = replay.replay_headless(records, width=width, height=height,
+                                         speed=args.replay_speed,
+                                         debounce=args.debounce / 1000.0,
+                                         max_latency=args.max_latency / 1000.0,
+                                         mode=args.mode, include_floating=args.include_floating,
+                                         alpha=args.alpha)
+        if profiler:
+            profiler.disable()
+        timings.report(sys.stdout)
+        report_profile()
+        return 0
+
+    import gi
+    gi.require_version('Gtk', '3.0')
+    from gi.repository import Gtk
+
+    from gui import TreeVisualizer
+    from ipc import SwayListener
+    from tree import TreeModel
+
+    app = TreeVisualizer(mode=args.mode, include_floating=args.include_floating, alpha=args.alpha, width=args.width, height=args.height,
+                         cache_budget=int(args.cache_mb * 1024 * 1024), overview=args.overview,
+                         animation_ms=args.animation_ms)
+    app.connect("destroy", Gtk.main_quit)
+    app.theme_watcher = start_theme_watcher(app)
+
+    # The listener never opens a socket here: the player hands it the
+    # recorded events, and its resyncs are answered from recorded snapshots.
+    model = TreeModel()
+    model.reset(replay.first_tree(records))
+    listener = SwayListener(callback=app.update_tree,
+                            debounce=args.debounce / 1000.0,
+                            max_latency=args.max_latency / 1000.0,
+                            check_interval=0, connection=replay.ReplayConnection(), model=model)
+    listener.overview = args.overview
+    app.on_overview_changed = listener.set_overview
+
+    from search import SearchIndex
+    app.search_index = SearchIndex()
+    app.search_index.rebuild(model.root)
+    listener.add_diff_listener(app.search_index.apply_diff)
+
+    def on_finished():
+        print(f"Replay finished: {listener.stats()}", file=sys.stderr)
+
+    player = replay.Player(records, listener, speed=args.replay_speed, on_finished=on_finished)
+    app.show_all()
+    player.start()
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    if profiler:
+        profiler.enable()
+    try:
+        Gtk.main()
+    finally:
+        if profiler:
+            profiler.disable()
+        listener.stop()
+        report_profile()
+    return 0
+
+
+def main():
+    """Main entry point for the Sway Tree Visualizer application."""
+    args = parse_args()
+    timer = StartupTimer(args.timings)
+
+    # 0. METRICS QUERY
+    # Talks to an already running viewer; needs nothing but the stdlib.
+    if args.query_metrics:
+        import json
+        import metrics
+        snapshot = metrics.send_query()
+        if snapshot is None:
+            print("No viewer with --metrics is running", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(snapshot, indent=2))
+        sys.exit(0)
+
+    # 0. HEADLESS EXPORT
+    # Snapshots for scripts and status bars never create a window.
+    if args.export or args.export_all:
+        sys.exit(run_export(args))
+
+    # 0. REPLAY
+    # Reproduce a recorded session offline, without talking to Sway.
+    if args.replay:
+        sys.exit(run_replay(args))
+
+    # 0. HUB
+    # Share one sway subscription with viewers started with --backend hub.
+    if args.hub:
+        sys.exit(run_hub(args))
+
+    # 0. RESIDENT INSTANCE
+    # If a daemon is already running, just ask it to toggle its window.
+    if daemon.send_command("toggle") is not None:
+        sys.exit(0)
+
+    # 0. THEME
+    # Not needed for a toggle, which the running instance answers.
+    load_theme(args)
+
+    # 0. CONNECT TO IPC EARLY (Before GUI creation)
+    # One connection is shared by the toggle check, the window rules, focus
+    # restore and the event listener. Its first tree also paints frame one.
+    import backends
+    from tree import TreeModel
+    timer.lap("imports")
+
+    model = TreeModel()
+    ipc = None
+    previous_focus_id = None
+    try:
+        ipc = backends.connect(args.backend)
+        timer.lap("ipc connect")
+        tree_data = ipc.get_tree_data()
+        model.reset(tree_data)
+        timer.lap("first tree")
+        previous_focus_id = model.focused_id
+
+        # 1. TOGGLE CHECK
+        # Search for an existing instance of our application
+        # We search by title since we set it in gui.py
+        existing = model.find_named("SwayTreeViewer")
+
+        if existing:
+            # If we find one, we assume the user wants to close it (Toggle behavior)
+            for node in existing:
+                ipc.command(f'[con_id={node.id}] kill')
+            sys.exit(0)
+
+        # PREVENT FOCUS STEALING
+        # Tell Sway explicitly NOT to focus this specific process's window when it appears.
+        # This is more reliable than restoring focus afterwards.
+        ipc.command(f'for_window [pid={os.getpid()}] no_focus')
+
+        # For transparent mode, set up floating rule before creating window
+        # This ensures it starts floating immediately (no tiling flicker)
+        if args.mode == "transparent":
+            ipc.command(f'for_window [pid={os.getpid()}] floating enable')
+
+    except Exception as e:
+        print(f"IPC Initialization Warning: {e}")
+
+    # Deferred until we know a window is actually needed
+    import gi
+    gi.require_version('Gtk', '3.0')
+    from gi.repository import Gtk, GLib
+
+    from gui import TreeVisualizer
+    from ipc import SwayListener
+    timer.lap("imports")
 
     # Create and configure the main application window
-    app = TreeVisualizer(mode=args.mode, include_floating=args.include_floating, alpha=args.alpha, width=args.width, height=args.height)
+    app = TreeVisualizer(mode=args.mode, include_floating=args.include_floating, alpha=args.alpha, width=args.width, height=args.height,
+                         cache_budget=int(args.cache_mb * 1024 * 1024), resident=args.daemon,
+                         overview=args.overview, animation_ms=args.animation_ms)
     app.connect("destroy", Gtk.main_quit)  # Handle window close event
+
+    def on_map(widget, event):
+        timer.lap("window map")
+        app.disconnect(map_handler)
+
+    def on_first_paint(widget, ctx):
+        timer.lap("first paint")
+        app.drawing_area.disconnect(paint_handler)
+        timer.report()
+
+    map_handler = app.connect("map-event", on_map)
+    paint_handler = app.drawing_area.connect_after("draw", on_first_paint)
+
+    # The listener runs inside the GTK main loop, so it can update the
+    # window directly; its scheduler keeps at most one update pending.
+    listener = SwayListener(callback=app.update_tree,
+                            debounce=args.debounce / 1000.0,
+                            max_latency=args.max_latency / 1000.0,
+                            connection=ipc, backend=args.backend, model=model)
+    listener.overview = args.overview
+    app.on_overview_changed = listener.set_overview
+
+    # Clicks and drags in the viewer become sway commands
+    def run_command(cmd):
+        if ipc:
+            try:
+                ipc.command(cmd)
+            except Exception as e:
+                print(f"Command failed: {e}")
+    app.on_command = run_command
+
+    # Search index, kept current from the listener's tree diffs
+    from search import SearchIndex
+    app.search_index = SearchIndex()
+    app.search_index.rebuild(model.root)
+    listener.add_diff_listener(app.search_index.apply_diff)
+
+    # Performance counters for the HUD and the metrics endpoints
+    from labels import label_cache
+    from metrics import metrics, MetricsServer, socket_path as metrics_socket_path
+    metrics.add_source("listener", listener.stats)
+    metrics.add_source("surface_cache", app.renderer.cache.stats)
+    metrics.add_source("label_cache", label_cache.stats)
+    if args.hud:
+        app.set_hud(True)
+
+    # Colors and sizes follow the theme file while the viewer runs
+    app.theme_watcher = start_theme_watcher(app)
+
+    # Log events and snapshots for offline replay (--replay)
+    if args.record:
+        import recording
+        try:
+            listener.recorder = recording.Recorder(args.record)
+            if model.root is not None:
+                listener.recorder.tree(tree_data)
+        except OSError as e:
+            print(f"Failed to open recording: {e}")
+
+    # Paint the first frame from the tree we already have
+    workspace, path = model.focused_view()
+    if workspace is not None:
+        app.update_tree(workspace, path)
+
     app.show_all()  # Make all widgets visible
 
     # 2. RESTORE FOCUS (Delayed)
     # Use GLib.timeout_add to restore focus AFTER the window manager has processed the 'show' event.
     # This mitigates race conditions where the WM steals focus back immediately after we restore it.
-    def restore_focus_delayed():
-        if previous_focus_id:
+    def restore_focus_delayed(focus_id):
+        if focus_id and ipc:
             try:
-                # Create a fresh connection for the thread/callback
-                r_ipc = i3ipc.Connection()
-                r_ipc.command(f'[con_id={previous_focus_id}] focus')
-                r_ipc.main_quit()
+                ipc.command(f'[con_id={focus_id}] focus')
             except Exception as e:
                 print(f"Failed to restore focus: {e}")
         return False # Stop the timeout function from repeating
 
     # Run after 50ms (adjust if still racy, but 50-100ms is usually sufficient)
-    GLib.timeout_add(50, restore_focus_delayed)
+    GLib.timeout_add(50, restore_focus_delayed, previous_focus_id)
 
-    def update_ui(tree, focused_ws_name):
-        """Update the GUI with new tree data from the main GTK thread."""
-        app.update_tree(tree, focused_ws_name)
-        return False  # Return False to stop the idle function (it's a one-off call)
+    # Attach the Sway event listener to the main loop
+    listener.start()
 
-    def on_tree_change(tree, focused_ws_name):
-        """Callback handler for tree changes - schedules UI update on main thread."""
-        # Schedule the update on the main GTK thread to avoid threading issues
-        GLib.idle_add(update_ui, tree, focused_ws_name)
+    # 3. DAEMON MODE
+    # Keep the window and tree model warm; later invocations toggle us over
+    # a local socket instead of cold-starting a new process.
+    server = None
+    if args.daemon:
+        def on_daemon_command(command):
+            if command == "quit":
+                Gtk.main_quit()
+                return "ok"
+            visible = app.get_visible()
+            if command == "hide" or (command == "toggle" and visible):
+                app.hide()
+                return "hidden"
+            if not visible:
+                # The for_window rules are keyed on our pid, so no_focus and
+                # floating apply again when the window is re-mapped.
+                focus_id = listener.model.focused_id
+                app.show_all()
+                GLib.timeout_add(50, restore_focus_delayed, focus_id)
+            return "visible"
 
-    # Start Sway event listener in a separate thread to avoid blocking the GUI
-    listener = SwayListener(callback=on_tree_change)
-    listener.start()
+        server = daemon.DaemonServer(on_daemon_command)
+        try:
+            server.start()
+        except OSError as e:
+            print(f"Failed to start daemon socket: {e}")
+            server = None
+
+    # 4. METRICS ENDPOINTS
+    metrics_server = None
+    if args.metrics or args.stats_file:
+        metrics_server = MetricsServer(path=metrics_socket_path() if args.metrics else None,
+                                       stats_file=args.stats_file, interval=args.stats_interval)
+        try:
+            metrics_server.start()
+        except OSError as e:
+            print(f"Failed to start metrics socket: {e}")
+            metrics_server = None
 
     # Restore default Ctrl+C behavior for graceful shutdown
     signal.signal(signal.SIGINT, signal.SIG_DFL)
@@ -118,8 +556,14 @@ def main():
     except KeyboardInterrupt:
         pass
     finally:
-        # Clean up the listener thread on exit
+        # Detach the listener and close its sockets
         listener.stop()
+        if listener.recorder:
+            listener.recorder.close()
+        if server:
+            server.stop()
+        if metrics_server:
+            metrics_server.stop()
 
 if __name__ == "__main__":
     main()
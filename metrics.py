@@ -0,0 +1,222 @@
+"""Lightweight runtime metrics for the HUD and the stats endpoints.
+
+Recording a sample is a deque append, so instrumentation can stay on all
+the time. Only the standard library is used: ``send_query`` works without
+GTK, like ``daemon.send_command``.
+"""
+import json
+import os
+import socket
+import time
+from collections import deque
+
+import daemon
+from timing import percentile
+
+# Samples kept per timer, and the window event rates are computed over
+SAMPLES = 256
+RATE_WINDOW = 5.0
+
+
+class Timer:
+    """Recent durations of one operation."""
+
+    def __init__(self):
+        self.samples = deque(maxlen=SAMPLES)
+        self.count = 0
+        self.last = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.last = seconds
+
+    def summary(self):
+        if not self.samples:
+            return {"count": self.count, "last_ms": 0.0, "avg_ms": 0.0,
+                    "p90_ms": 0.0, "max_ms": 0.0}
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "last_ms": self.last * 1000,
+            "avg_ms": sum(ordered) / len(ordered) * 1000,
+            "p90_ms": percentile(ordered, 90) * 1000,
+            "max_ms": ordered[-1] * 1000,
+        }
+
+
+class Rate:
+    """Occurrences per second over the last RATE_WINDOW seconds."""
+
+    def __init__(self):
+        self.total = 0
+        self._times = deque()
+
+    def add(self):
+        now = time.monotonic()
+        self.total += 1
+        self._times.append(now)
+        self._trim(now)
+
+    def _trim(self, now):
+        while self._times and self._times[0] < now - RATE_WINDOW:
+            self._times.popleft()
+        # Bounded even under an event storm
+        while len(self._times) > 10000:
+            self._times.popleft()
+
+    def per_second(self):
+        self._trim(time.monotonic())
+        return len(self._times) / RATE_WINDOW
+
+
+class Metrics:
+    """Named timers, rates and gauges, plus pluggable stats sources."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.timers = {}
+        self.rates = {}
+        self.gauges = {}
+        self._sources = {}  # name -> callable returning a dict
+
+    def record(self, name, seconds):
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = Timer()
+        timer.add(seconds)
+
+    def count(self, name):
+        rate = self.rates.get(name)
+        if rate is None:
+            rate = self.rates[name] = Rate()
+        rate.add()
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def add_source(self, name, fn):
+        """Include ``fn()`` (e.g. a component's stats()) in snapshots."""
+        self._sources[name] = fn
+
+    def timer(self, name):
+        return self.timers.get(name) or Timer()
+
+    def rate(self, name):
+        return self.rates.get(name) or Rate()
+
+    def snapshot(self):
+        data = {
+            "uptime_s": round(time.monotonic() - self.started, 1),
+            "timers": {name: t.summary() for name, t in self.timers.items()},
+            "rates": {name: {"total": r.total, "per_second": r.per_second()}
+                      for name, r in self.rates.items()},
+            "gauges": dict(self.gauges),
+        }
+        for name, fn in self._sources.items():
+            try:
+                data[name] = fn()
+            except Exception as e:
+                data[name] = {"error": str(e)}
+        return data
+
+    def hud_lines(self):
+        """Short text lines for the on-screen overlay."""
+        def ms(name):
+            t = self.timers.get(name)
+            if t is None or not t.samples:
+                return "-"
+            s = t.summary()
+            return f"{s['last_ms']:.2f} ms (avg {s['avg_ms']:.2f}, max {s['max_ms']:.2f})"
+
+        frames = self.rate("frames")
+        return [
+            f"events   {self.rate('events').per_second():6.1f}/s  ({self.rate('events').total} total)",
+            f"ipc get  {ms('ipc_fetch')}",
+            f"nodes    {self.gauges.get('nodes', '-')}",
+            f"layout   {ms('layout')}",
+            f"paint    {ms('paint')}",
+            f"frame    {ms('frame')}  {frames.per_second():.1f} fps",
+        ]
+
+
+# Shared by every component in the process
+metrics = Metrics()
+
+
+def socket_path():
+    """Per-session metrics socket, next to the daemon control socket."""
+    return daemon.socket_path("metrics")
+
+
+def send_query(path=None, timeout=0.5):
+    """Return the metrics snapshot of a running viewer, or None."""
+    path = path or socket_path()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        return json.loads(b"".join(chunks))
+    except (OSError, ValueError):
+        return None
+
+
+class MetricsServer:
+    """Serves a JSON snapshot to every client that connects, then closes.
+
+    Can also write the snapshot to a file every ``interval`` seconds (written
+    to a temporary file and renamed, so readers never see a partial file).
+    """
+
+    def __init__(self, source=metrics, path=None, stats_file=None, interval=5):
+        self.source = source
+        self.path = path
+        self.stats_file = stats_file
+        self.interval = interval
+        self.server = daemon.UnixServer(path, self._on_accept) if path else None
+        self._timer_id = None
+
+    def start(self):
+        # Imported here so the client side of this module stays GTK-free
+        from gi.repository import GLib
+
+        if self.server:
+            self.server.start()
+        if self.stats_file:
+            self._timer_id = GLib.timeout_add_seconds(max(1, int(self.interval)),
+                                                      self._on_interval)
+
+    def _payload(self):
+        return json.dumps(self.source.snapshot(), indent=1).encode()
+
+    def _on_accept(self, conn):
+        with conn:
+            conn.settimeout(0.5)
+            try:
+                conn.sendall(self._payload())
+            except OSError:
+                pass
+
+    def _on_interval(self):
+        tmp = self.stats_file + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(self._payload())
+            os.replace(tmp, self.stats_file)
+        except OSError as e:
+            print(f"Failed to write stats file: {e}")
+        return True
+
+    def stop(self):
+        if self.server:
+            self.server.stop()
+        if self._timer_id is not None:
+            from gi.repository import GLib
+            GLib.source_remove(self._timer_id)
+            self._timer_id = None
@@ -0,0 +1,124 @@
+"""Session recordings for offline profiling (--record / --replay).
+
+A recording is a gzip file of JSON lines. Every run that records into the
+same file appends one gzip member, starting with a ``start`` record:
+
+    {"k": "start", "t": 0, "time": <unix time>, "v": 1}
+    {"k": "tree", "t": 0.0, "data": <GET_TREE reply>}
+    {"k": "event", "t": 1.234, "name": "window", "data": <event payload>}
+
+``t`` is seconds since the start of that run. Trees are the snapshots the
+listener fetched (initial tree, resyncs, consistency checks); events are the
+raw subscription payloads, before any delta is applied.
+"""
+import gzip
+import json
+import time
+import zlib
+
+FORMAT_VERSION = 1
+
+# Sync-flush the compressor this long after the first unflushed record, so a
+# crashed session still leaves a readable file without giving up most of the
+# compression.
+FLUSH_INTERVAL = 1.0
+
+
+class Recorder:
+    """Appends timestamped events and tree snapshots to a recording.
+
+    Flushes run on a GLib timeout, so the tail of a burst reaches the file
+    even if nothing else is recorded afterwards.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = 0
+        self._file = gzip.open(path, "ab")
+        self._start = time.monotonic()
+        self._flush_id = None  # Pending GLib timeout
+        self._write({"k": "start", "t": 0, "time": time.time(), "v": FORMAT_VERSION})
+
+    def _write(self, record):
+        if self._file is None:
+            return
+        self._file.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+        self.records += 1
+        if self._flush_id is None:
+            # Imported here so loading recordings stays GTK-free
+            from gi.repository import GLib
+            self._flush_id = GLib.timeout_add(int(FLUSH_INTERVAL * 1000), self._on_flush)
+
+    def _on_flush(self):
+        self._flush_id = None
+        if self._file is not None:
+            self._file.flush(zlib.Z_SYNC_FLUSH)
+        return False
+
+    def _now(self):
+        return round(time.monotonic() - self._start, 4)
+
+    def tree(self, data):
+        self._write({"k": "tree", "t": self._now(), "data": data})
+
+    def event(self, name, data):
+        self._write({"k": "event", "t": self._now(), "name": name, "data": data})
+
+    def close(self):
+        if self._flush_id is not None:
+            from gi.repository import GLib
+            GLib.source_remove(self._flush_id)
+            self._flush_id = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class Record:
+    """One entry of a loaded recording, on a single continuous timeline."""
+
+    __slots__ = ("t", "kind", "name", "data")
+
+    def __init__(self, t, kind, name, data):
+        self.t = t
+        self.kind = kind  # "tree" or "event"
+        self.name = name  # Event name (None for trees)
+        self.data = data
+
+
+def read(path):
+    """Yield the Records of a recording, oldest first.
+
+    Runs appended to the same file are laid end to end. A file cut short
+    by a crash yields everything up to the last complete record.
+    """
+    offset = 0.0
+    last = 0.0
+    with gzip.open(path, "rt") as f:
+        try:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    break  # Torn final line
+                kind = rec.get("k")
+                if kind == "start":
+                    offset = last
+                    continue
+                last = offset + rec["t"]
+                yield Record(last, kind, rec.get("name"), rec.get("data"))
+        except (EOFError, zlib.error, OSError):
+            pass
+
+
+def load(path):
+    return list(read(path))
+
+
+def is_recording(path):
+    """True if ``path`` looks like a recording (gzip magic)."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(2) == b"\x1f\x8b"
+    except OSError:
+        return False
@@ -0,0 +1,275 @@
+import math
+from collections import OrderedDict
+
+import cairo
+
+from labels import label_cache
+from layout import OP_FILL, OP_BORDER, OP_TAB
+from theme import theme
+
+# Header labels follow the theme's font
+label_cache.set_family(theme.font_family)
+theme.add_listener(lambda t: label_cache.set_family(t.font_family))
+
+
+def _visible(box, clip):
+    x0, y0, x1, y1 = clip
+    return box.x <= x1 and box.y <= y1 and box.x + box.w >= x0 and box.y + box.h >= y0
+
+
+def paint_background(ctx, transparent):
+    if transparent:
+        # Clear background fully for transparency
+        ctx.set_source_rgba(0, 0, 0, 0)
+        ctx.set_operator(cairo.OPERATOR_SOURCE)
+        ctx.paint()
+        ctx.set_operator(cairo.OPERATOR_OVER)
+    else:
+        ctx.set_source_rgba(*theme.background)
+        ctx.paint()
+
+
+def paint_breadcrumb(ctx, text, width):
+    """Header line above the tree (window mode)."""
+    ctx.save()
+    ctx.set_source_rgba(*theme.breadcrumb)
+    label_cache.show(ctx, label_cache.fit(text, 12, width - 20), 10, 20)
+    ctx.restore()
+
+
+def paint_hud(ctx, lines, width):
+    """Performance overlay in the top right corner; returns its rectangle."""
+    size = 11
+    ctx.save()
+    # The lines carry live numbers, so they bypass the label cache: caching
+    # them would evict window titles and skew its hit rate
+    ctx.select_font_face(label_cache.family, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
+    ctx.set_font_size(size)
+    w = max(ctx.text_extents(line).x_advance for line in lines) + 16
+    h = len(lines) * (size + 4) + 10
+    x = width - w - 10
+    y = 10
+
+    ctx.rectangle(x, y, w, h)
+    ctx.set_source_rgba(0, 0, 0, 0.75)
+    ctx.fill()
+    ctx.set_source_rgb(0.6, 1.0, 0.6)
+    for i, line in enumerate(lines):
+        ctx.move_to(x + 8, y + 5 + (i + 1) * (size + 4) - 4)
+        ctx.show_text(line)
+    ctx.restore()
+    return int(x) - 1, y - 1, int(w) + 3, h + 2
+
+
+def paint_drop_target(ctx, box):
+    """Highlight the container a dragged one would be moved to."""
+    ctx.save()
+    ctx.rectangle(box.x, box.y, box.w, box.h)
+    ctx.set_source_rgba(0.3, 0.7, 1.0, 0.25)
+    ctx.fill_preserve()
+    ctx.set_source_rgb(0.3, 0.7, 1.0)
+    ctx.set_line_width(2)
+    ctx.set_dash([6, 4])
+    ctx.stroke()
+    ctx.restore()
+
+
+def paint_dim(ctx):
+    """Darken everything painted so far (search mode)."""
+    ctx.save()
+    ctx.set_source_rgba(0, 0, 0, 0.5)
+    ctx.paint()
+    ctx.restore()
+
+
+def paint_highlight(ctx, box, color, width=2):
+    """Outline a box, e.g. a search match or the keyboard selection."""
+    ctx.save()
+    ctx.rectangle(box.x, box.y, box.w, box.h)
+    ctx.set_source_rgba(*color, 0.2)
+    ctx.fill_preserve()
+    ctx.set_source_rgb(*color)
+    ctx.set_line_width(width)
+    ctx.stroke()
+    ctx.restore()
+
+
+def paint_search_bar(ctx, text, width, height):
+    """Query line along the bottom edge (search mode)."""
+    ctx.save()
+    ctx.rectangle(0, height - 26, width, 26)
+    ctx.set_source_rgba(0.05, 0.05, 0.05, 0.9)
+    ctx.fill()
+    ctx.set_source_rgb(1.0, 0.85, 0.3)
+    label_cache.show(ctx, label_cache.fit(text, 12, width - 20), 10, height - 8)
+    ctx.restore()
+
+
+def paint_layout(ctx, layout, alpha):
+    """Replay a Layout onto a cairo context.
+
+    Boxes outside the current clip (e.g. a dirty region queued with
+    ``queue_draw_area``) are skipped.
+    """
+    clip = ctx.clip_extents()
+    styles = theme.styles(alpha)
+    for op, box in layout.ops:
+        if not _visible(box, clip):
+            continue
+        if op == OP_FILL:
+            paint_fill(ctx, box, styles.boxes[box.style])
+        elif op == OP_BORDER:
+            paint_border(ctx, box, styles.boxes[box.style])
+        elif op == OP_TAB:
+            paint_tab(ctx, box, styles.tab)
+
+
+def paint_fill(ctx, box, style):
+    # 1. Draw Background (Bottom Layer)
+    ctx.save()
+    ctx.rectangle(box.x, box.y, box.w, box.h)
+    ctx.set_source_rgba(*style.background)
+    ctx.fill() # Only fill
+    ctx.restore()
+
+    # 2. Draw Header Label
+    if box.header_h:
+        paint_header(ctx, box, style)
+
+
+def paint_header(ctx, box, style):
+    header_h = box.header_h
+    ctx.save()
+    ctx.rectangle(box.x, box.y, box.w, header_h)
+    ctx.clip()
+
+    # Center vertically in the header strip
+    ctx.set_source_rgba(*style.text)
+    weight = cairo.FONT_WEIGHT_BOLD if style.bold else cairo.FONT_WEIGHT_NORMAL
+    label = label_cache.fit(box.label, min(style.font_size, header_h - 2), box.w - 8, weight)
+    label_cache.show(ctx, label, box.x + 4, box.y + (header_h / 2) + 4)
+    ctx.restore()
+
+
+def paint_border(ctx, box, style):
+    # Draw Border (Top Layer - Ensures Focus is Visible)
+    ctx.save()
+    ctx.rectangle(box.x, box.y, box.w, box.h)
+    ctx.set_source_rgba(*style.border)
+    ctx.set_line_width(style.border_width)
+    ctx.stroke()
+    ctx.restore()
+
+
+def paint_tab(ctx, box, color):
+    # Highlight Active Tab
+    ctx.save()
+    ctx.rectangle(box.x, box.y, box.w, box.h)
+    ctx.set_source_rgba(*color)
+    ctx.fill()
+    ctx.restore()
+
+
+class SurfaceCache:
+    """LRU cache of rasterized header labels with a memory budget in bytes."""
+
+    def __init__(self, budget=64 * 1024 * 1024):
+        self.budget = budget
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (surface, size in bytes)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, surface):
+        size = surface.get_stride() * surface.get_height()
+        if size > self.budget:
+            return  # Too big to ever fit; the caller uses it once and drops it
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old[1]
+        self._entries[key] = (surface, size)
+        self.bytes += size
+        while self.bytes > self.budget:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.bytes -= evicted
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class RetainedRenderer:
+    """Paints a Layout, reusing rasterized box headers.
+
+    Fills, borders and tab markers are plain rectangles, painted as vectors
+    straight into the target, so they follow its clip and scale. Header
+    labels are the expensive part: each is rasterized once per (label,
+    width, header height, style, sub-pixel offset, alpha, theme, device
+    scale) and then blitted, also for other boxes that look the same. A
+    cached surface never contains children, so a title change re-rasterizes
+    a single header strip and boxes outside the clip cost nothing.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else SurfaceCache()
+
+    def paint(self, ctx, layout, alpha):
+        clip = ctx.clip_extents()
+        styles = theme.styles(alpha)
+        target = ctx.get_target()
+        scale = target.get_device_scale()[0]
+        for op, box in layout.ops:
+            if not _visible(box, clip):
+                continue
+            if op == OP_FILL:
+                style = styles.boxes[box.style]
+                ctx.rectangle(box.x, box.y, box.w, box.h)
+                ctx.set_source_rgba(*style.background)
+                ctx.fill()
+                if box.header_h and box.label:
+                    self._paint_header(ctx, target, scale, box, style, alpha)
+            elif op == OP_BORDER:
+                paint_border(ctx, box, styles.boxes[box.style])
+            elif op == OP_TAB:
+                paint_tab(ctx, box, styles.tab)
+
+    def _paint_header(self, ctx, target, scale, box, style, alpha):
+        x0 = math.floor(box.x)
+        y0 = math.floor(box.y)
+        fx = round((box.x - x0) * 4)
+        fy = round((box.y - y0) * 4)
+        key = (box.label, box.w, box.header_h, box.style, fx, fy, alpha,
+               theme.generation, scale)
+        width = math.ceil(box.x + box.w) - x0
+        height = math.ceil(box.y + box.header_h) - y0
+        surface = self.cache.get(key)
+        if surface is None:
+            surface = target.create_similar_image(cairo.FORMAT_ARGB32,
+                                                  math.ceil(width * scale),
+                                                  math.ceil(height * scale))
+            surface.set_device_scale(scale, scale)
+            sctx = cairo.Context(surface)
+            # Keep using window coordinates inside the surface
+            sctx.translate(-x0, -y0)
+            paint_header(sctx, box, style)
+            self.cache.put(key, surface)
+        ctx.set_source_surface(surface, x0, y0)
+        ctx.rectangle(x0, y0, width, height)
+        ctx.fill()
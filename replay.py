@@ -0,0 +1,186 @@
+"""Feed a recording back into the viewer (--replay).
+
+``Player`` drives a SwayListener from the GLib main loop, so the GUI shows
+the session exactly as the listener would have seen it live.
+``replay_headless`` needs neither GTK nor GLib: it applies the recording to
+a TreeModel and renders every published view into an offscreen surface,
+timing each stage.
+"""
+import time
+
+from timing import Timings
+from tree import TreeModel
+
+
+class ReplayConnection:
+    """Stands in for a sway connection: serves ``tree_data`` to GET_TREE.
+
+    During replay it holds the recorded snapshot sway would have answered
+    with; the benchmarks hand it a generated tree.
+    """
+
+    socket_path = None
+
+    def __init__(self, tree_data=None):
+        self.tree_data = tree_data
+
+    def get_tree_data(self):
+        return self.tree_data
+
+    def command(self, cmd):
+        return [{"success": True}]  # Commands (e.g. focus) are not replayed
+
+
+def upcoming_trees(records):
+    """For every record, the data of the first tree snapshot at or after it."""
+    upcoming = [None] * len(records)
+    tree = None
+    for i in range(len(records) - 1, -1, -1):
+        if records[i].kind == "tree":
+            tree = records[i].data
+        upcoming[i] = tree
+    # Past the last snapshot, keep serving it
+    last = next((r.data for r in reversed(records) if r.kind == "tree"), None)
+    return [t if t is not None else last for t in upcoming]
+
+
+def first_tree(records):
+    return next((r.data for r in records if r.kind == "tree"), None)
+
+
+class Player:
+    """Replays records into a SwayListener on GLib timeouts.
+
+    ``speed`` scales the recorded timeline; 0 replays as fast as possible
+    (one record per idle callback, so redraws and the listener's debounce
+    timeouts still run in between).
+    """
+
+    def __init__(self, records, listener, speed=1.0, on_finished=None):
+        self.records = records
+        self.listener = listener
+        self.speed = speed
+        self.on_finished = on_finished
+        self._upcoming = upcoming_trees(records)
+        self._index = 0
+        self._t0 = None
+
+    def start(self):
+        self._t0 = time.monotonic()
+        self._schedule()
+
+    def _schedule(self):
+        from gi.repository import GLib
+
+        if self._index >= len(self.records):
+            if self.on_finished:
+                self.on_finished()
+            return
+        if self.speed <= 0:
+            GLib.idle_add(self._step)
+            return
+        due = self.records[self._index].t / self.speed
+        delay = max(0.0, due - (time.monotonic() - self._t0))
+        GLib.timeout_add(int(delay * 1000), self._step)
+
+    def _step(self):
+        elapsed = time.monotonic() - self._t0
+        while self._index < len(self.records):
+            rec = self.records[self._index]
+            if self.speed > 0 and rec.t / self.speed > elapsed:
+                break
+            self._play(self._index, rec)
+            self._index += 1
+            if self.speed <= 0:
+                break
+        self._schedule()
+        return False
+
+    def _play(self, i, rec):
+        conn = self.listener.connection
+        conn.tree_data = self._upcoming[i]
+        if rec.kind == "tree":
+            conn.tree_data = rec.data
+            self.listener.refresh_tree(conn)
+        elif rec.kind == "event":
+            self.listener.on_ipc_event(rec.name, rec.data)
+
+
+def replay_headless(records, width=1600, height=900, speed=0.0, debounce=0.03,
+                    max_latency=0.15, mode="window", include_floating=False, alpha=1.0):
+    """Replay into an offscreen renderer; returns a Timings.
+
+    Events are grouped into refreshes with the same debounce rules the live
+    listener uses, applied to the recorded timestamps.
+    """
+    import cairo
+    from export import Exporter, breadcrumb
+
+    timings = Timings()
+    model = TreeModel()
+    exporter = Exporter(model, width=width, height=height, mode=mode,
+                        include_floating=include_floating, alpha=alpha)
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+    ctx = cairo.Context(surface)
+    upcoming = upcoming_trees(records)
+
+    published = None
+    needs_resync = False
+
+    def apply(rec):
+        if rec.name == "window":
+            return model.apply_window_event(rec.data["change"], rec.data["container"])
+        if rec.name == "workspace":
+            return model.apply_workspace_event(rec.data["change"], rec.data.get("current"),
+                                               rec.data.get("old"))
+        return False
+
+    def render():
+        nonlocal published
+        ws, path = model.focused_view()
+        if ws is None:
+            return
+        key = (ws, tuple(n.name or n.type for n in path))
+        if key == published:
+            return  # Same view as last frame: the viewer would not redraw
+        published = key
+        layout = timings.time("layout", exporter.layout_for, ws)
+        timings.time("paint", exporter.paint, ctx, layout, breadcrumb(path))
+        surface.flush()
+
+    start = time.monotonic()
+    burst_first = burst_last = None
+    for i, rec in enumerate(records):
+        if speed > 0:
+            delay = rec.t / speed - (time.monotonic() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+        # Close the pending burst if the scheduler would have fired by now
+        if burst_first is not None and rec.t > min(burst_last + debounce,
+                                                   burst_first + max_latency):
+            if needs_resync and upcoming[i] is not None:
+                timings.time("resync", model.reset, upcoming[i])
+                needs_resync = False
+            render()
+            burst_first = None
+
+        if rec.kind == "tree":
+            timings.time("resync", model.reset, rec.data)
+            needs_resync = False
+            render()
+            continue
+
+        if model.root is None:
+            continue  # Events before the first snapshot have nothing to apply to
+        if not timings.time("event", apply, rec):
+            needs_resync = True
+        if burst_first is None:
+            burst_first = rec.t
+        burst_last = rec.t
+
+    if burst_first is not None:
+        if needs_resync and upcoming[-1] is not None:
+            timings.time("resync", model.reset, upcoming[-1])
+        render()
+    return timings
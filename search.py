@@ -0,0 +1,119 @@
+"""Incremental search index over container names, app_ids and marks.
+
+Queries of three characters or more intersect trigram posting sets; shorter
+ones use a word-prefix table. Either way only the candidates are checked
+against the query, so typing never walks the tree. The index is kept up to
+date from TreeDiffs (``apply_diff``), not rebuilt from get_tree().
+"""
+import re
+
+from diff import ADDED, REMOVED, MOVED, RETITLED, MARKED
+
+# Short queries match the start of any word in the indexed text
+_WORD = re.compile(r"\w+")
+SHORT_PREFIX = 2
+
+# Containers that are never search results
+_SKIPPED_TYPES = ("root", "output")
+
+
+def search_text(node):
+    """The text a container is found by (lowercase)."""
+    parts = [node.name or "", node.app_id or ""]
+    parts.extend(node.marks)
+    return "\n".join(p for p in parts if p).lower()
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _prefixes(text):
+    found = set()
+    for word in _WORD.findall(text):
+        for n in range(1, min(SHORT_PREFIX, len(word)) + 1):
+            found.add(word[:n])
+    return found
+
+
+class SearchIndex:
+    def __init__(self):
+        self._text = {}      # con id -> indexed text
+        self._order = {}     # con id -> insertion counter (stable result order)
+        self._trigrams = {}  # trigram -> {con id}
+        self._prefixes = {}  # word prefix -> {con id}
+        self._counter = 0
+
+    def __len__(self):
+        return len(self._text)
+
+    def rebuild(self, root):
+        """Index a whole tree (initial fill)."""
+        self.__init__()
+        stack = [root] if root is not None else []
+        while stack:
+            node = stack.pop()
+            self.update(node)
+            stack.extend(reversed(node.children()))
+
+    def update(self, node):
+        """Add or re-index one container (its children are not touched)."""
+        if node.type in _SKIPPED_TYPES:
+            return
+        text = search_text(node)
+        old = self._text.get(node.id)
+        if old == text:
+            return
+        if old is not None:
+            self._unpost(node.id, old)
+        if not text:
+            self._text.pop(node.id, None)
+            return
+        self._text[node.id] = text
+        if node.id not in self._order:
+            self._counter += 1
+            self._order[node.id] = self._counter
+        for gram in _trigrams(text):
+            self._trigrams.setdefault(gram, set()).add(node.id)
+        for prefix in _prefixes(text):
+            self._prefixes.setdefault(prefix, set()).add(node.id)
+
+    def remove(self, con_id):
+        text = self._text.pop(con_id, None)
+        self._order.pop(con_id, None)
+        if text is not None:
+            self._unpost(con_id, text)
+
+    def _unpost(self, con_id, text):
+        for table, keys in ((self._trigrams, _trigrams(text)), (self._prefixes, _prefixes(text))):
+            for key in keys:
+                ids = table.get(key)
+                if ids is not None:
+                    ids.discard(con_id)
+                    if not ids:
+                        del table[key]
+
+    def apply_diff(self, diff):
+        """Keep the index in step with a diff.TreeDiff."""
+        for change in diff:
+            if change.kind == REMOVED:
+                self.remove(change.con_id)
+            elif change.kind in (ADDED, RETITLED, MARKED, MOVED):
+                self.update(change.new)
+
+    def search(self, query, limit=None):
+        """Con ids whose text contains ``query`` (short queries: word prefix)."""
+        query = query.lower().strip()
+        if not query:
+            return []
+        if len(query) < 3:
+            candidates = self._prefixes.get(query[:SHORT_PREFIX], set())
+            matches = [i for i in candidates
+                       if any(w.startswith(query) for w in _WORD.findall(self._text[i]))]
+        else:
+            # Intersect the rarest posting sets first
+            sets = sorted((self._trigrams.get(g, set()) for g in _trigrams(query)), key=len)
+            candidates = set(sets[0]).intersection(*sets[1:]) if sets else set()
+            matches = [i for i in candidates if query in self._text[i]]
+        matches.sort(key=self._order.get)
+        return matches[:limit] if limit else matches
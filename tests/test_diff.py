@@ -0,0 +1,113 @@
+"""diff_trees: classify the changes between two TreeModel snapshots."""
+from diff import (diff_trees, ADDED, REMOVED, MOVED, RESIZED, RETITLED, MARKED,
+                  FOCUS_CHANGED, LAYOUT_CHANGED)
+from tree import Node
+from test_tree import con, model_of, session
+
+
+def kinds(diff):
+    return sorted((c.kind, c.con_id) for c in diff)
+
+
+def after_reset(edit):
+    """Diff of a full resync to the session as changed by ``edit(data)``."""
+    model = model_of(session())
+    before = model.root
+    data = session()
+    edit(data)
+    model.reset(data)
+    return diff_trees(before, model.root)
+
+
+def workspace_1(data):
+    return data["nodes"][0]["nodes"][0]
+
+
+def test_no_change_is_falsy():
+    model = model_of(session())
+    assert not diff_trees(model.root, model.root)
+    assert not after_reset(lambda data: None)
+
+
+def test_retitled():
+    model = model_of(session())
+    before = model.root
+    model.apply_window_event("title", {"id": 11, "name": "vim"})
+    diff = diff_trees(before, model.root)
+    assert kinds(diff) == [(RETITLED, 11)]
+    assert not diff.geometric
+
+
+def test_marked():
+    model = model_of(session())
+    before = model.root
+    model.apply_window_event("mark", {"id": 13, "marks": ["a"]})
+    assert kinds(diff_trees(before, model.root)) == [(MARKED, 13)]
+
+
+def test_focus_changed():
+    model = model_of(session())
+    before = model.root
+    model.apply_window_event("focus", {"id": 21})
+    diff = diff_trees(before, model.root)
+    assert {c.kind for c in diff} == {FOCUS_CHANGED}
+    # The two windows and the focus stacks above the new one
+    assert diff.ids() == {11, 21, 2}
+
+
+def test_removed():
+    model = model_of(session())
+    before = model.root
+    model.apply_window_event("close", {"id": 11})
+    diff = diff_trees(before, model.root)
+    assert diff.ids(REMOVED) == {11}
+    assert diff.geometric
+
+
+def test_added():
+    diff = after_reset(lambda data: workspace_1(data)["nodes"].append(con(14, "new")))
+    assert diff.ids(ADDED) == {14}
+    assert not diff.ids(REMOVED, MOVED)
+
+
+def test_resized_and_layout_changed():
+    def edit(data):
+        workspace_1(data)["nodes"][0]["rect"]["width"] = 50
+        workspace_1(data)["nodes"][1]["layout"] = "stacked"
+    diff = after_reset(edit)
+    assert kinds(diff) == sorted([(RESIZED, 11), (LAYOUT_CHANGED, 12)])
+
+
+def test_moved_across_parents():
+    def edit(data):
+        tabbed = workspace_1(data)["nodes"].pop(1)
+        data["nodes"][0]["nodes"][1]["nodes"].append(tabbed)
+    diff = after_reset(edit)
+    # Reported once, not as removed + added; the child moved along with it
+    assert diff.ids(MOVED) == {12}
+    assert not diff.ids(ADDED, REMOVED)
+    assert 13 not in diff.ids()
+
+
+def test_tiling_to_floating_is_a_move():
+    def edit(data):
+        window = workspace_1(data)["nodes"].pop(0)
+        workspace_1(data)["floating_nodes"].append(window)
+    assert after_reset(edit).ids(MOVED) == {11}
+
+
+def test_reordered_siblings():
+    def edit(data):
+        workspace_1(data)["nodes"].reverse()
+    diff = after_reset(edit)
+    assert diff.ids(MOVED) == {11, 12}
+    assert not diff.ids(ADDED, REMOVED)
+
+
+def test_shared_subtrees_are_not_walked():
+    # Walking this node would fail: its children are not a tuple
+    poisoned = Node(30, "3", "workspace", nodes=None, floating_nodes=None)
+    window = Node(31, "term")
+    old = Node(1, "root", "root", nodes=(poisoned, Node(40, "4", "workspace", nodes=(window,))))
+    new = old.copy(nodes=(poisoned, old.nodes[1].copy(nodes=(window.copy(name="vim"),))))
+    assert kinds(diff_trees(old, new)) == [(RETITLED, 31)]
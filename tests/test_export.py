@@ -0,0 +1,35 @@
+"""Exporter: JSON snapshots of the computed layout."""
+import json
+
+import pytest
+
+pytest.importorskip("cairo")
+
+from export import Exporter  # noqa: E402
+from tree import TreeModel  # noqa: E402
+from test_tree import session  # noqa: E402
+
+
+def exporter():
+    model = TreeModel()
+    model.reset(session())
+    return Exporter(model, width=800, height=600)
+
+
+def test_json_export(tmp_path):
+    path = tmp_path / "out.json"
+    exporter().export(str(path))
+    data = json.loads(path.read_text())
+    assert data["workspace"] == "1"
+    parents = {box["id"]: box["parent"] for box in data["boxes"]}
+    assert parents[10] is None
+    assert parents[11] == 10
+    assert parents[12] == 10
+    assert parents[13] == 12
+
+
+def test_json_export_all(tmp_path):
+    paths = exporter().export_all(str(tmp_path), fmt="json")
+    assert sorted(p.rsplit("/", 1)[1] for p in paths) == ["1.json", "2.json"]
+    data = json.loads((tmp_path / "2.json").read_text())
+    assert [(box["id"], box["parent"]) for box in data["boxes"]] == [(20, None), (21, 20)]
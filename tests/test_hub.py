@@ -0,0 +1,130 @@
+"""Hub protocol: snapshots and patches must rebuild the hub's tree exactly."""
+import json
+import types
+
+import hub
+from diff import diff_trees
+from tree import TreeModel, tree_equal
+from test_tree import con, model_of, session
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    def sendall(self, data):
+        self.sent.append(data)
+
+
+class Link:
+    """A hub server and one subscriber, with messages passed by hand."""
+
+    def __init__(self):
+        self.source = model_of(session())
+        listener = types.SimpleNamespace(model=self.source)
+        self.server = hub.HubServer(listener, path="unused")
+        self.server._root = self.source.root
+        self.client = hub._Client(None)
+        self.client.write_watch = object()  # Queue without touching GLib
+        self.server.clients.add(self.client)
+
+        self.mirror = TreeModel()
+        self.changes = []
+        self.sub = hub.HubSubscription("unused", self.mirror, self.changes.append)
+        self.sub.sock = FakeSocket()
+
+        self.server._on_request(self.client, "subscribe")
+        self.deliver()
+
+    def messages(self):
+        queued = [json.loads(m) for m in self.client.queue]
+        self.client.queue.clear()
+        self.client.pending = 0
+        return queued
+
+    def deliver(self, messages=None):
+        for message in self.messages() if messages is None else messages:
+            self.sub._apply(message)
+
+    def publish(self):
+        """Broadcast what changed in the source since the last publish."""
+        self.server._on_diff(diff_trees(self.server._root, self.source.root))
+
+    def in_sync(self):
+        return tree_equal(self.mirror.root, self.source.root)
+
+
+def test_snapshot_then_patch():
+    link = Link()
+    assert link.in_sync()
+    assert link.changes == [None]
+
+    workspace = link.mirror.get(10)
+    link.source.apply_window_event("title", {"id": 21, "name": "news"})
+    link.publish()
+    [patch] = link.messages()
+    # Only the retitled window and its ancestors are sent
+    assert [n["id"] for n in patch["nodes"]] == [1, 2, 20, 21]
+    link.deliver([patch])
+    assert link.in_sync()
+    assert link.changes[-1] == [("retitled", 21)]
+    # Unchanged subtrees are shared with the previous mirror snapshot
+    assert link.mirror.get(10) is workspace
+
+
+def test_moved_subtree():
+    link = Link()
+    data = session()
+    tabbed = data["nodes"][0]["nodes"][0]["nodes"].pop(1)
+    data["nodes"][0]["nodes"][0]["focus"] = [11]
+    data["nodes"][0]["nodes"][1]["nodes"].append(tabbed)
+    data["nodes"][0]["nodes"][1]["focus"] = [21, 12]
+    link.source.reset(data)
+    link.publish()
+    link.deliver()
+    assert link.in_sync()
+    assert link.mirror.parent_of(12).id == 20
+    assert link.mirror.parent_of(13).id == 12
+
+
+def test_missed_patch_requests_snapshot():
+    link = Link()
+    link.source.apply_window_event("title", {"id": 21, "name": "news"})
+    link.publish()
+    link.messages()  # Lost
+    link.source.apply_window_event("title", {"id": 11, "name": "vim"})
+    link.publish()
+    before = link.mirror.root
+    link.deliver()
+    assert link.sub.sock.sent == [b"snapshot\n"]
+    assert link.sub.seq is None
+    assert link.mirror.root is before
+
+    link.server._on_request(link.client, "snapshot")
+    link.deliver()
+    assert link.in_sync()
+
+
+def test_patch_with_unknown_id_requests_snapshot():
+    link = Link()
+    seq = link.sub.seq
+    record = hub.node_record(link.source.get(20))
+    record["nodes"].append(999)
+    link.deliver([{"type": "patch", "seq": seq + 1, "base": seq, "root": 1,
+                   "nodes": [hub.node_record(link.source.root),
+                             hub.node_record(link.source.get(2)), record],
+                   "changes": []}])
+    assert link.sub.sock.sent == [b"snapshot\n"]
+    assert link.in_sync()  # Nothing was applied
+
+
+def test_new_window_patch():
+    link = Link()
+    data = session()
+    data["nodes"][0]["nodes"][1]["nodes"].append(con(22, "mail"))
+    link.source.reset(data)
+    link.publish()
+    link.deliver()
+    assert link.in_sync()
+    assert link.mirror.parent_of(22).id == 20
+    assert ("added", 22) in link.changes[-1]
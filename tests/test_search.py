@@ -0,0 +1,78 @@
+"""SearchIndex: diffs must keep the index equal to a fresh rebuild."""
+from diff import diff_trees
+from search import SearchIndex
+from test_tree import con, model_of, session
+
+
+def indexed(root):
+    index = SearchIndex()
+    index.rebuild(root)
+    return index
+
+
+def state(index):
+    return index._text, index._trigrams, index._prefixes
+
+
+class Mirror:
+    """A model and an index kept in step through apply_diff."""
+
+    def __init__(self, data=None):
+        self.model = model_of(data or session())
+        self.index = indexed(self.model.root)
+
+    def apply(self, change):
+        before = self.model.root
+        change(self.model)
+        self.index.apply_diff(diff_trees(before, self.model.root))
+        assert state(self.index) == state(indexed(self.model.root))
+
+
+def test_retitled():
+    mirror = Mirror()
+    mirror.apply(lambda m: m.apply_window_event("title", {"id": 11, "name": "htop"}))
+    assert mirror.index.search("htop") == [11]
+    assert mirror.index.search("term") == []
+
+
+def test_removed():
+    mirror = Mirror()
+    mirror.apply(lambda m: m.apply_window_event("close", {"id": 11}))
+    assert mirror.index.search("term") == []
+    assert 11 not in mirror.index._text
+    # No posting set is left behind empty
+    assert all(mirror.index._trigrams.values())
+    assert all(mirror.index._prefixes.values())
+
+
+def test_marked():
+    mirror = Mirror()
+    mirror.apply(lambda m: m.apply_window_event("mark", {"id": 21, "marks": ["mail"]}))
+    assert mirror.index.search("mail") == [21]
+    mirror.apply(lambda m: m.apply_window_event("mark", {"id": 21, "marks": []}))
+    assert mirror.index.search("mail") == []
+
+
+def test_added_by_resync():
+    mirror = Mirror()
+    data = session()
+    data["nodes"][0]["nodes"][1]["nodes"].append(con(22, "music player"))
+    mirror.apply(lambda m: m.reset(data))
+    assert mirror.index.search("play") == [22]
+
+
+def test_short_queries_match_word_prefixes():
+    index = indexed(model_of(con(1, "root", "root", nodes=[
+        con(2, "eDP-1", "output", nodes=[
+            con(10, "1", "workspace", nodes=[
+                con(11, "vim notes"), con(12, "nvim"), con(13, "Visual Studio"),
+            ]),
+        ]),
+    ])).root)
+    # Fewer than three characters: start of a word only, case-insensitive
+    assert index.search("vi") == [11, 13]
+    assert index.search("no") == [11]
+    # Three or more: anywhere in the text
+    assert index.search("vim") == [11, 12]
+    assert index.search("tes") == [11]
+    assert index.search("xyz") == []
@@ -0,0 +1,51 @@
+"""Theme: section overrides and reloads of broken files."""
+import pytest
+
+from theme import Theme, parse_color
+
+
+class N:
+    def __init__(self, type, app_id=None, focused=False):
+        self.type = type
+        self.app_id = app_id
+        self.focused = focused
+
+
+def theme_of(tmp_path, text):
+    path = tmp_path / "theme.ini"
+    path.write_text(text)
+    theme = Theme()
+    theme.load(str(path))
+    return theme, path
+
+
+def background(theme, node, is_leaf=False):
+    return theme.styles(1.0).boxes[theme.style_key(node, is_leaf)].background
+
+
+def test_type_sections(tmp_path):
+    theme, _ = theme_of(tmp_path, "[colors]\ncontainer = #111111\n"
+                                  "[type:workspace]\ncontainer = #222222\n"
+                                  "[type:floating_con]\nwindow = #333333\n"
+                                  "[app_id:firefox]\nwindow = #444444\n")
+    assert background(theme, N("con")) == parse_color("#111111")
+    assert background(theme, N("workspace")) == parse_color("#222222")
+    assert background(theme, N("floating_con"), True) == parse_color("#333333")
+    # The app_id section wins over the type section
+    assert background(theme, N("floating_con", "firefox"), True) == parse_color("#444444")
+    assert background(theme, N("con", "firefox"), True) == parse_color("#444444")
+
+
+def test_unknown_type_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        theme_of(tmp_path, "[type:window]\nwindow = #333333\n")
+
+
+def test_broken_reload_keeps_theme(tmp_path):
+    theme, path = theme_of(tmp_path, "[colors]\nwindow = #123456\n")
+    generation = theme.generation
+    path.write_text("[colors]\nwindow = %(missing)s\n")
+    with pytest.raises(ValueError):
+        theme.load()
+    assert theme.generation == generation
+    assert background(theme, N("con"), True) == parse_color("#123456")
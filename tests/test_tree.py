@@ -0,0 +1,140 @@
+"""TreeModel: event deltas must leave the mirror equal to a fresh get_tree()."""
+from tree import TreeModel, Node, tree_equal
+
+
+def con(id, name=None, type="con", layout="none", nodes=(), focused=False, focus=None):
+    return {"id": id, "name": name, "type": type, "layout": layout,
+            "rect": {"x": 0, "y": 0, "width": 100, "height": 100},
+            "focused": focused, "nodes": list(nodes), "floating_nodes": [],
+            "focus": focus if focus is not None else [n["id"] for n in nodes]}
+
+
+def session():
+    """root > output > workspaces "1" (focused, two windows) and "2"."""
+    return con(1, "root", "root", nodes=[
+        con(2, "eDP-1", "output", nodes=[
+            con(10, "1", "workspace", "splith", nodes=[
+                con(11, "term", focused=True),
+                con(12, None, layout="tabbed", nodes=[con(13, "editor")]),
+            ]),
+            con(20, "2", "workspace", "splith", nodes=[con(21, "browser")]),
+        ]),
+    ])
+
+
+def model_of(data):
+    model = TreeModel()
+    model.reset(data)
+    return model
+
+
+def test_title_event():
+    model = model_of(session())
+    assert model.apply_window_event("title", {"id": 11, "name": "vim"})
+    assert model.get(11).name == "vim"
+    assert model.focused_view()[0].id == 10
+
+
+def test_focus_event_switches_workspace():
+    model = model_of(session())
+    assert model.apply_window_event("focus", {"id": 21})
+    assert model.focused_id == 21
+    assert model.focused_workspace == "2"
+    assert not model.get(11).focused
+    assert model.get(2).focus[0] == 20
+
+
+def test_rename_focused_workspace_without_old_payload():
+    model = model_of(session())
+    assert model.apply_workspace_event("rename", {"id": 10, "name": "1:web"}, None)
+    ws, path = model.focused_view()
+    assert ws is not None and ws.name == "1:web"
+    assert [n.id for n in path] == [1, 2, 10]
+
+
+def test_rename_other_workspace_keeps_focus():
+    model = model_of(session())
+    assert model.apply_workspace_event("rename", {"id": 20, "name": "2:mail"}, None)
+    assert model.focused_workspace == "1"
+    assert model.workspace("2:mail").id == 20
+
+
+def test_close_matches_fresh_tree():
+    model = model_of(session())
+    assert model.apply_window_event("close", {"id": 11})
+    expected = session()
+    expected["nodes"][0]["nodes"][0]["nodes"].pop(0)
+    expected["nodes"][0]["nodes"][0]["focus"] = [12]
+    assert tree_equal(model.root, Node.from_dict(expected))
+    assert model.get(11) is None
+
+
+def test_close_last_child_of_container_needs_resync():
+    # Sway reaps the emptied tabbed container; the event does not say so
+    model = model_of(session())
+    assert not model.apply_window_event("close", {"id": 13})
+
+
+def test_deltas_keep_old_snapshots_intact():
+    model = model_of(session())
+    before = model.root
+    model.apply_window_event("title", {"id": 21, "name": "news"})
+    assert before.nodes[0].nodes[1].nodes[0].name == "browser"
+    # The untouched workspace is shared between the two snapshots
+    assert model.root.nodes[0].nodes[0] is before.nodes[0].nodes[0]
+
+
+def index_of(model):
+    return ({i: n.id for i, n in model._index.items()}, model._parent, model._workspaces,
+            model.focused_id, model.focused_workspace)
+
+
+def replaced(model, root):
+    """``model`` after replace_root(root), and a model indexed from scratch."""
+    model.replace_root(root)
+    fresh = TreeModel()
+    fresh.replace_root(root)
+    return model, fresh
+
+
+def test_replace_root_with_deltas_matches_full_index():
+    source = model_of(session())
+    mirror = TreeModel()
+    mirror.replace_root(source.root)
+    source.apply_window_event("title", {"id": 12, "name": "tabs"})
+    source.apply_window_event("focus", {"id": 21})
+    source.apply_window_event("close", {"id": 11})
+    source.apply_workspace_event("rename", {"id": 10, "name": "1:code"})
+    model, fresh = replaced(mirror, source.root)
+    assert index_of(model) == index_of(fresh)
+    assert model.get(11) is None
+    assert model.workspace("1") is None
+
+
+def test_replace_root_with_moved_subtree():
+    source = model_of(session())
+    mirror = TreeModel()
+    mirror.replace_root(source.root)
+    # Move the tabbed container to workspace 2; reset() shares the unchanged subtree
+    data = session()
+    tabbed = data["nodes"][0]["nodes"][0]["nodes"].pop(1)
+    data["nodes"][0]["nodes"][1]["nodes"].append(tabbed)
+    source.reset(data)
+    assert source.get(12) is mirror.get(12)
+    model, fresh = replaced(mirror, source.root)
+    assert index_of(model) == index_of(fresh)
+    assert model.parent_of(13).id == 12
+    assert model.parent_of(12).id == 20
+
+
+def test_replace_root_moves_focus():
+    source = model_of(session())
+    mirror = TreeModel()
+    mirror.replace_root(source.root)
+    source.apply_window_event("focus", {"id": 13})
+    source.apply_window_event("focus", {"id": 11})
+    mirror.replace_root(source.root)
+    source.apply_window_event("focus", {"id": 21})
+    model, fresh = replaced(mirror, source.root)
+    assert index_of(model) == index_of(fresh)
+    assert model.focused_id == 21
@@ -0,0 +1,265 @@
+"""Colors, fonts and sizes, read from an INI file.
+
+The file is parsed once and compiled into a table of Styles, one per
+(node type rule, app_id rule, leaf, focused) state. The layout pass stores each box's index
+into that table, so painting a box costs a single list lookup.
+
+Example ``~/.config/swaytreeviewer/theme.ini``::
+
+    [layout]
+    padding = 5
+    header_height = 20
+    tab_size = 22
+
+    [font]
+    family = Sans
+    size = 10
+    bold = yes
+
+    [colors]
+    window = #2e2e2e
+    focused_border = #4db3ff
+
+    [type:workspace]
+    container = #202830
+
+    [app_id:firefox]
+    window = #4d2a10
+"""
+import configparser
+import os
+
+DEFAULTS = {
+    "layout": {
+        "padding": "5",
+        "header_height": "20",
+        "tab_size": "22",  # Height of tab/stack headers
+    },
+    "font": {
+        "family": "Sans",
+        "size": "10",
+        "bold": "yes",
+    },
+    "borders": {
+        "width": "1",
+        "focused_width": "2",
+    },
+    "colors": {
+        "background": "#262626",      # Window background
+        "breadcrumb": "#cccccc",
+        "container": "#1a1a1a",       # Split/tabbed/stacked containers
+        "window": "#2e2e2e",          # Leaves
+        "focused": "#1a334d",
+        "text": "#b3b3b3",
+        "focused_text": "#ffffff",
+        "border": "#4d4d4d",
+        "focused_border": "#4db3ff",
+        "active_tab": "#3399ff",
+    },
+}
+
+# Keys of [colors] (and [borders]) that a [type:...] or [app_id:...] section
+# may override
+APP_KEYS = ("container", "window", "focused", "text", "focused_text", "border",
+            "focused_border", "width", "focused_width")
+
+# Node types a [type:...] section can restyle
+NODE_TYPES = ("output", "workspace", "con", "floating_con")
+
+
+def default_path():
+    config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    return os.path.join(config_home, "swaytreeviewer", "theme.ini")
+
+
+def parse_color(value):
+    """'#rrggbb' or '#rrggbbaa' -> (r, g, b, a) floats."""
+    value = value.strip().lstrip("#")
+    if len(value) not in (6, 8):
+        raise ValueError(f"Invalid color {value!r}")
+    parts = [int(value[i:i + 2], 16) / 255 for i in range(0, len(value), 2)]
+    return tuple(parts) if len(parts) == 4 else tuple(parts) + (1.0,)
+
+
+class Style:
+    """Everything needed to paint one box, with the window alpha applied."""
+
+    __slots__ = ("background", "text", "border", "border_width", "font_size", "bold")
+
+    def __init__(self, background, text, border, border_width, font_size, bold):
+        self.background = background  # (r, g, b, a)
+        self.text = text
+        self.border = border
+        self.border_width = border_width
+        self.font_size = font_size
+        self.bold = bold
+
+
+class StyleTable:
+    """Compiled styles for one alpha: ``boxes[box.style]``."""
+
+    def __init__(self, boxes, tab):
+        self.boxes = boxes
+        self.tab = tab  # Active tab marker color
+
+
+class Theme:
+    def __init__(self, path=None):
+        self.path = path
+        self.generation = 0  # Bumped on every (re)load; part of render/layout cache keys
+        self._listeners = []
+        self._load(configparser.ConfigParser())
+
+    def add_listener(self, fn):
+        """Call ``fn(theme)`` after every successful reload."""
+        self._listeners.append(fn)
+
+    def load(self, path=None):
+        """Read the theme file (missing file: defaults). Raises ValueError."""
+        self.path = path or self.path
+        parser = configparser.ConfigParser()
+        try:
+            if self.path:
+                parser.read(self.path)
+        except configparser.Error as e:
+            raise ValueError(f"{self.path}: {e}")
+        self._load(parser)
+        for fn in self._listeners:
+            fn(self)
+
+    def _load(self, parser):
+        def get(section, key):
+            if parser.has_option(section, key):
+                return parser.get(section, key)
+            return DEFAULTS[section][key]
+
+        # Everything is parsed before anything is assigned, so a broken
+        # file leaves the current theme untouched
+        try:
+            pad = float(get("layout", "padding"))
+            header_h = float(get("layout", "header_height"))
+            tab_size = float(get("layout", "tab_size"))
+            font_size = float(get("font", "size"))
+            bold = get("font", "bold").strip().lower() in ("1", "yes", "true", "on")
+            base = {key: get("colors", key) for key in DEFAULTS["colors"]}
+            base.update({key: get("borders", key) for key in DEFAULTS["borders"]})
+
+            # Overrides from [type:...] and [app_id:...] sections; index 0
+            # of each list means "no section applies"
+            type_layers, type_rules = [{}], {}
+            app_layers, app_rules = [{}], {}
+            for section in parser.sections():
+                keys = {k: v for k, v in parser.items(section) if k in APP_KEYS}
+                if section.startswith("type:"):
+                    node_type = section[len("type:"):].strip()
+                    if node_type not in NODE_TYPES:
+                        raise ValueError(f"Unknown node type in [{section}]")
+                    type_rules[node_type] = len(type_layers)
+                    type_layers.append(keys)
+                elif section.startswith("app_id:"):
+                    app_rules[section[len("app_id:"):].strip()] = len(app_layers)
+                    app_layers.append(keys)
+
+            # One rule per (type, app_id) pair; the app_id section wins
+            rules = []
+            for type_keys in type_layers:
+                for app_keys in app_layers:
+                    rule = dict(base)
+                    rule.update(type_keys)
+                    rule.update(app_keys)
+                    rules.append(rule)
+
+            states = []  # Index = style key
+            for rule in rules:
+                for is_leaf in (False, True):
+                    for focused in (False, True):
+                        if focused:
+                            bg, text, border = rule["focused"], rule["focused_text"], rule["focused_border"]
+                            width = float(rule["focused_width"])
+                        else:
+                            bg = rule["window"] if is_leaf else rule["container"]
+                            text, border = rule["text"], rule["border"]
+                            width = float(rule["width"])
+                        states.append((parse_color(bg), parse_color(text),
+                                       parse_color(border), width, font_size, bold))
+            background = parse_color(get("colors", "background"))
+            breadcrumb = parse_color(get("colors", "breadcrumb"))
+            active_tab = parse_color(get("colors", "active_tab"))
+        except (ValueError, KeyError, configparser.Error) as e:
+            raise ValueError(f"{self.path or 'theme'}: {e}")
+
+        self.pad, self.header_h, self.tab_size = pad, header_h, tab_size
+        self.font_family = get("font", "family")
+        self.background, self.breadcrumb = background, breadcrumb
+        self._active_tab = active_tab
+        self._type_rules = type_rules
+        self._app_rules = app_rules
+        self._app_count = len(app_layers)
+        self._states = states
+        self._tables = {}
+        self.generation += 1
+
+    def style_key(self, node, is_leaf):
+        """Index of a node's style in every StyleTable."""
+        rule = self._type_rules.get(node.type, 0) * self._app_count
+        if node.app_id:
+            rule += self._app_rules.get(node.app_id, 0)
+        return rule * 4 + is_leaf * 2 + bool(node.focused)
+
+    def styles(self, alpha):
+        """StyleTable with ``alpha`` applied (compiled once per alpha)."""
+        table = self._tables.get(alpha)
+        if table is None:
+            def fade(color):
+                return color[:3] + (color[3] * alpha,)
+            boxes = [Style(fade(bg), fade(text), fade(border), width, size, bold)
+                     for bg, text, border, width, size, bold in self._states]
+            table = self._tables[alpha] = StyleTable(boxes, fade(self._active_tab))
+        return table
+
+
+class ThemeWatcher:
+    """Reloads a Theme when its file changes (Gio.FileMonitor)."""
+
+    def __init__(self, theme, on_reload=None):
+        self.theme = theme
+        self.on_reload = on_reload
+        self._monitor = None
+
+    def start(self):
+        # Imported here so headless users of this module stay GTK-free
+        from gi.repository import Gio
+
+        # Watch the directory so editors that replace the file are noticed
+        directory = Gio.File.new_for_path(os.path.dirname(self.theme.path) or ".")
+        self._monitor = directory.monitor_directory(Gio.FileMonitorFlags.WATCH_MOVES, None)
+        self._monitor.connect("changed", self._on_changed)
+
+    def _on_changed(self, monitor, file, other_file, event_type):
+        from gi.repository import Gio
+
+        names = {f.get_basename() for f in (file, other_file) if f is not None}
+        if os.path.basename(self.theme.path) not in names:
+            return
+        if event_type not in (Gio.FileMonitorEvent.CHANGES_DONE_HINT,
+                              Gio.FileMonitorEvent.CREATED,
+                              Gio.FileMonitorEvent.MOVED_IN,
+                              Gio.FileMonitorEvent.RENAMED,
+                              Gio.FileMonitorEvent.DELETED):
+            return
+        try:
+            self.theme.load()
+        except ValueError as e:
+            print(f"Theme not reloaded: {e}")
+            return
+        if self.on_reload:
+            self.on_reload()
+
+    def stop(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+
+
+# Shared by the layout engine and every renderer in the process
+theme = Theme()
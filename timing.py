@@ -0,0 +1,60 @@
+"""Latency samples and percentiles for the runtime metrics, --replay
+--headless and the benchmarks. Standard library only."""
+import time
+
+
+def percentile(ordered, pct):
+    """The ``pct`` percentile of an already sorted list (0.0 if empty)."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Stage:
+    """Latency samples for one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.samples = []
+
+    def time(self, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        self.samples.append(time.perf_counter() - start)
+        return result
+
+    def percentile(self, pct):
+        return percentile(sorted(self.samples), pct)
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        return {
+            "count": len(ordered),
+            "p50": percentile(ordered, 50),
+            "p90": percentile(ordered, 90),
+            "p99": percentile(ordered, 99),
+            "max": ordered[-1] if ordered else 0.0,
+        }
+
+
+class Timings:
+    """Stages by name, created on first use."""
+
+    def __init__(self, names=()):
+        self.stages = {name: Stage(name) for name in names}
+
+    def time(self, stage, fn, *args):
+        if stage not in self.stages:
+            self.stages[stage] = Stage(stage)
+        return self.stages[stage].time(fn, *args)
+
+    def summary(self):
+        return {name: stage.summary() for name, stage in self.stages.items() if stage.samples}
+
+    def report(self, out, width=10):
+        print(f"{'stage':<{width}} {'count':>6} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}",
+              file=out)
+        for name, s in self.summary().items():
+            print(f"{name:<{width}} {s['count']:>6} " +
+                  " ".join(f"{s[k] * 1000:7.3f}ms" for k in ("p50", "p90", "p99", "max")),
+                  file=out)
@@ -0,0 +1,441 @@
+import re
+import sys
+from collections import namedtuple
+
+
+Rect = namedtuple("Rect", ["x", "y", "width", "height"])
+Rect.EMPTY = Rect(0, 0, 0, 0)
+
+
+class Node:
+    """Lightweight, immutable-by-convention snapshot of a sway container.
+
+    Only the fields the viewer reads are kept. Snapshots are never mutated
+    after being handed out: updates copy the changed node and its ancestors
+    (path copying), so consumers can hold on to an old snapshot (e.g. the
+    last painted one) while the model moves on.
+    """
+
+    __slots__ = ("id", "name", "type", "layout", "rect", "focused", "focus",
+                 "nodes", "floating_nodes", "app_id", "pid", "marks")
+
+    def __init__(self, id, name=None, type="con", layout="none", rect=Rect.EMPTY,
+                 focused=False, focus=(), nodes=(), floating_nodes=(),
+                 app_id=None, pid=None, marks=()):
+        self.id = id
+        self.name = name
+        self.type = type
+        self.layout = layout
+        self.rect = rect
+        self.focused = focused
+        self.focus = focus
+        self.nodes = nodes
+        self.floating_nodes = floating_nodes
+        self.app_id = app_id  # Wayland app_id, or the X11 class for Xwayland windows
+        self.pid = pid
+        self.marks = marks
+
+    @classmethod
+    def from_dict(cls, data, previous=None):
+        """Build a node (and its whole subtree) from GET_TREE style JSON.
+
+        ``previous`` maps con ids to the nodes of an older snapshot. Nodes
+        whose fields and children did not change are taken from it instead
+        of being rebuilt, so consecutive snapshots share unchanged subtrees.
+        """
+        r = data.get("rect")
+        app_id = data.get("app_id")
+        if app_id is None and data.get("window_properties"):
+            app_id = data["window_properties"].get("class")
+        fields = {
+            "name": data.get("name"),
+            "type": intern(data.get("type", "con")),
+            "layout": intern(data.get("layout", "none")),
+            "rect": Rect(r["x"], r["y"], r["width"], r["height"]) if r else Rect.EMPTY,
+            "focused": data.get("focused", False),
+            "focus": tuple(data.get("focus", ())),
+            "nodes": tuple(cls.from_dict(c, previous) for c in data.get("nodes", ())),
+            "floating_nodes": tuple(cls.from_dict(c, previous)
+                                    for c in data.get("floating_nodes", ())),
+            "app_id": intern(app_id),
+            "pid": data.get("pid"),
+            "marks": tuple(intern(m) for m in data.get("marks", ())),
+        }
+        if previous is not None:
+            old = previous.get(data["id"])
+            if old is not None and _unchanged(old, fields):
+                return old
+        return cls(data["id"], **fields)
+
+    def copy(self, **changes):
+        """Return a shallow copy with some fields replaced."""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return Node(**fields)
+
+    def children(self):
+        return self.nodes + self.floating_nodes
+
+    def __repr__(self):
+        return f"<Node {self.id} {self.type} {self.name!r}>"
+
+
+def intern(value):
+    """sys.intern for strings; anything else (e.g. None) is returned as is."""
+    # Types, layouts, app_ids and marks come from small sets and repeat on
+    # every node and every fetch. Titles are not interned: they are mostly
+    # unique and would only grow the interned table.
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _unchanged(node, fields):
+    for name, value in fields.items():
+        current = getattr(node, name)
+        if name in ("nodes", "floating_nodes"):
+            # Children were already shared where possible: compare identity
+            if len(current) != len(value) or any(a is not b for a, b in zip(current, value)):
+                return False
+        elif current != value:
+            return False
+    return True
+
+
+def tree_equal(a, b):
+    """Structural comparison of two snapshots (used for consistency checks)."""
+    if a is b:
+        return True
+    if (a.id, a.name, a.type, a.layout, a.rect, a.focused, a.focus, a.app_id, a.marks) != \
+       (b.id, b.name, b.type, b.layout, b.rect, b.focused, b.focus, b.app_id, b.marks):
+        return False
+    if len(a.nodes) != len(b.nodes) or len(a.floating_nodes) != len(b.floating_nodes):
+        return False
+    return all(tree_equal(x, y) for x, y in zip(a.children(), b.children()))
+
+
+class TreeModel:
+    """Local mirror of the sway layout tree, indexed by con id.
+
+    ``window`` and ``workspace`` event payloads are applied as deltas where
+    that can be done safely. The ``apply_*`` methods return False when an
+    event cannot be applied (e.g. a new window, whose parent the event does
+    not name) and the caller should fall back to a full resync.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.version = 0
+        self.focused_workspace = None
+        self._index = {}   # con id -> Node
+        self._parent = {}  # con id -> parent con id
+        self._workspaces = {}  # workspace name -> con id
+        self._focused_id = None
+
+    # ----- Full resync -----
+
+    def reset(self, tree_data):
+        """Replace the mirror with a freshly fetched GET_TREE reply.
+
+        Unchanged subtrees keep the objects of the current snapshot, so a
+        resync that changes little costs little memory and is cheap to diff.
+        """
+        self._set_root(Node.from_dict(tree_data, self._index or None))
+
+    def replace_root(self, root):
+        """Install a snapshot built elsewhere (e.g. received from a hub).
+
+        Subtrees shared with the current snapshot keep their index entries,
+        so only the copied paths (and whatever disappeared) are visited.
+        """
+        old_root = self.root
+        if old_root is None or old_root.id != root.id:
+            self._set_root(root)
+            return
+
+        self.root = root
+        seen = set()
+        removed = []
+        stack = [(old_root, root, None)]
+        while stack:
+            old, new, parent_id = stack.pop()
+            if old is new:
+                continue
+            seen.add(new.id)
+            self._index_node(new, parent_id)
+            previous = {c.id: c for c in old.children()} if old is not None else {}
+            for child in new.children():
+                stack.append((previous.pop(child.id, None), child, new.id))
+            removed.extend(previous.values())
+
+        # Unindex what is gone, unless it moved elsewhere in the new snapshot
+        while removed:
+            node = removed.pop()
+            if node.id not in seen:
+                self._unindex_node(node)
+            removed.extend(node.children())
+        self.focused_workspace = self._find_focused_workspace()
+        self.version += 1
+
+    def _set_root(self, root):
+        self.root = root
+        self._index = {}
+        self._parent = {}
+        self._workspaces = {}
+        self._focused_id = None
+        self._reindex(root, None)
+        self.focused_workspace = self._find_focused_workspace()
+        self.version += 1
+
+    def _reindex(self, node, parent_id):
+        self._index_node(node, parent_id)
+        for child in node.children():
+            self._reindex(child, node.id)
+
+    def _unindex(self, node):
+        self._unindex_node(node)
+        for child in node.children():
+            self._unindex(child)
+
+    def _index_node(self, node, parent_id):
+        old = self._index.get(node.id)
+        if old is not None and old.type == "workspace" and self._workspaces.get(old.name) == node.id:
+            del self._workspaces[old.name]  # Renamed
+        self._index[node.id] = node
+        self._parent[node.id] = parent_id
+        if node.focused:
+            self._focused_id = node.id
+        elif self._focused_id == node.id:
+            self._focused_id = None
+        if node.type == "workspace":
+            self._workspaces[node.name] = node.id
+
+    def _unindex_node(self, node):
+        self._index.pop(node.id, None)
+        self._parent.pop(node.id, None)
+        if node.id == self._focused_id:
+            self._focused_id = None
+        if node.type == "workspace" and self._workspaces.get(node.name) == node.id:
+            del self._workspaces[node.name]
+
+    # ----- Queries -----
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def focused_id(self):
+        """Con id of the focused container, or None."""
+        return self._focused_id
+
+    def get(self, con_id):
+        return self._index.get(con_id)
+
+    def parent_of(self, con_id):
+        return self._index.get(self._parent.get(con_id))
+
+    def ancestors(self, con_id):
+        """Yield the ancestors of a node, nearest first."""
+        parent_id = self._parent.get(con_id)
+        while parent_id is not None:
+            yield self._index[parent_id]
+            parent_id = self._parent.get(parent_id)
+
+    def workspace_of(self, con_id):
+        node = self._index.get(con_id)
+        if node is not None and node.type == "workspace":
+            return node
+        return next((a for a in self.ancestors(con_id) if a.type == "workspace"), None)
+
+    def find_named(self, pattern):
+        """Return all nodes whose name matches a regular expression."""
+        regex = re.compile(pattern)
+        return [n for n in self._index.values() if n.name and regex.search(n.name)]
+
+    def workspace(self, name):
+        """Look up a workspace by name without walking the tree."""
+        return self._index.get(self._workspaces.get(name))
+
+    def workspaces(self):
+        """Return every workspace in tree order (scratchpad excluded)."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            if node.type == "workspace":
+                if not (node.name or "").startswith("__"):
+                    found.append(node)
+                continue
+            stack.extend(reversed(node.nodes))
+        return found
+
+    def path_to(self, con_id):
+        """Return the nodes from the root down to ``con_id`` (inclusive)."""
+        node = self._index.get(con_id)
+        if node is None:
+            return []
+        path = list(self.ancestors(con_id))
+        path.reverse()
+        path.append(node)
+        return path
+
+    def focused_view(self):
+        """Return ``(workspace, path)`` for the focused workspace.
+
+        This is all the GUI draws, so it never needs the rest of the tree.
+        """
+        ws = self.workspace(self.focused_workspace)
+        if ws is None:
+            return None, []
+        return ws, self.path_to(ws.id)
+
+    def _find_focused_workspace(self):
+        # Follow the focus stack from the root down to the first workspace
+        node = self.root
+        while node is not None and node.type != "workspace":
+            if not node.focus:
+                return None
+            node = self._index.get(node.focus[0])
+        return node.name if node is not None else None
+
+    def is_consistent_with(self, tree_data):
+        return self.root is not None and tree_equal(self.root, Node.from_dict(tree_data))
+
+    # ----- Copy-on-write updates -----
+
+    def _replace(self, old, new):
+        """Swap ``old`` for ``new`` and copy every ancestor up to the root."""
+        self._index[new.id] = new
+        parent = self.parent_of(old.id)
+        while parent is not None:
+            new_parent = parent.copy(
+                nodes=tuple(new if c is old else c for c in parent.nodes),
+                floating_nodes=tuple(new if c is old else c for c in parent.floating_nodes),
+            )
+            self._index[new_parent.id] = new_parent
+            old, new = parent, new_parent
+            parent = self.parent_of(parent.id)
+        self.root = new
+
+    def _update(self, con_id, **changes):
+        node = self._index.get(con_id)
+        if node is None:
+            return False
+        self._replace(node, node.copy(**changes))
+        return True
+
+    def _set_focus(self, con_id):
+        node = self._index.get(con_id)
+        if node is None:
+            return False
+
+        # Clear the previously focused node
+        if self._focused_id not in (None, con_id):
+            self._update(self._focused_id, focused=False)
+        self._focused_id = con_id
+
+        if not node.focused:
+            self._update(con_id, focused=True)
+        self._raise(con_id)
+
+        ws = self.workspace_of(con_id)
+        if ws is not None:
+            self.focused_workspace = ws.name
+        return True
+
+    def _raise(self, con_id):
+        """Move a branch to the front of each ancestor's focus stack."""
+        child_id = con_id
+        for ancestor in list(self.ancestors(con_id)):
+            ancestor = self._index[ancestor.id]  # May have been copied above
+            if ancestor.focus[:1] != (child_id,):
+                focus = (child_id,) + tuple(i for i in ancestor.focus if i != child_id)
+                self._update(ancestor.id, focus=focus)
+            child_id = ancestor.id
+
+    def _remove(self, con_id):
+        node = self._index.get(con_id)
+        parent = self.parent_of(con_id)
+        if node is None or parent is None:
+            return False
+        if parent.type == "con" and len(parent.children()) == 1:
+            # Sway reaps a split/tabbed container with its last child, and
+            # may reflow its siblings: only a full resync gets that right
+            return False
+        self._replace(parent, parent.copy(
+            nodes=tuple(c for c in parent.nodes if c.id != con_id),
+            floating_nodes=tuple(c for c in parent.floating_nodes if c.id != con_id),
+            focus=tuple(i for i in parent.focus if i != con_id),
+        ))
+        self._unindex(node)
+        return True
+
+    # ----- Event deltas -----
+
+    def apply_window_event(self, change, container):
+        """Apply a ``window`` event. ``container`` is the raw event payload."""
+        con_id = container.get("id")
+        if con_id not in self._index:
+            return False
+
+        if change == "title":
+            applied = self._update(con_id, name=container.get("name"))
+        elif change == "focus":
+            applied = self._set_focus(con_id)
+        elif change == "close":
+            applied = self._remove(con_id)
+        elif change == "mark":
+            applied = self._update(con_id, marks=tuple(intern(m) for m in container.get("marks", ())))
+        elif change in ("urgent", "fullscreen_mode"):
+            # Nothing the viewer draws depends on these
+            applied = True
+        else:
+            # new / move / floating: the payload does not say where the
+            # container ended up, so only a full resync is safe.
+            return False
+
+        if applied:
+            self.version += 1
+        return applied
+
+    def apply_workspace_event(self, change, current, old=None):
+        """Apply a ``workspace`` event. ``current``/``old`` are raw payloads."""
+        if not current or current.get("id") not in self._index:
+            return False
+        con_id = current["id"]
+
+        if change == "focus":
+            # The payload carries the complete workspace subtree; swap it in.
+            ws = self._index[con_id]
+            parent_id = self._parent[con_id]
+            focused_id = self._focused_id
+            new_ws = Node.from_dict(current)
+            self._unindex(ws)
+            self._reindex(new_ws, parent_id)
+            self._replace(ws, new_ws)
+
+            if self._focused_id is not None and self._focused_id != focused_id:
+                # The new subtree holds the focused node; unfocus the old one
+                if focused_id in self._index:
+                    self._update(focused_id, focused=False)
+                applied = self._set_focus(self._focused_id)
+            else:
+                self._raise(con_id)
+                self.focused_workspace = new_ws.name
+                applied = True
+        elif change == "rename":
+            old_name = self._index[con_id].name
+            applied = self._update(con_id, name=current.get("name"))
+            if self._workspaces.get(old_name) == con_id:
+                del self._workspaces[old_name]
+            self._workspaces[current.get("name")] = con_id
+            # Sway sends ``old: null`` on renames, so go by the mirror's name
+            if applied and self.focused_workspace == old_name:
+                self.focused_workspace = current.get("name")
+        elif change == "urgent":
+            applied = True
+        else:
+            # init / empty / move / reload change the set of workspaces
+            return False
+
+        if applied:
+            self.version += 1
+        return applied